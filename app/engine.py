@@ -1,17 +1,199 @@
-from typing import Dict, Any, Callable, List, Optional, TYPE_CHECKING
-from datetime import datetime
+from typing import (
+    Dict, Any, Callable, Deque, FrozenSet, Iterator, List, Mapping, NamedTuple, Optional,
+    Tuple, TYPE_CHECKING
+)
+from collections import OrderedDict, defaultdict, deque
+from types import MappingProxyType
+import ast
+import functools
+import hashlib
+import operator
+import pickle
+import threading
+import time
 import uuid
-import copy
+import weakref
+
+import orjson
 
 if TYPE_CHECKING:
     from app.tools import ToolRegistry
 
 
+# AST node types that can be folded to a constant without looking at state
+_FOLDABLE_NODES = (
+    ast.Expression, ast.Constant, ast.BoolOp, ast.Compare, ast.UnaryOp,
+    ast.boolop, ast.cmpop, ast.unaryop
+)
+
+# Operators supported in edge conditions
+_COMPARE_OPS = {
+    ast.Eq: operator.eq, ast.NotEq: operator.ne,
+    ast.Lt: operator.lt, ast.LtE: operator.le,
+    ast.Gt: operator.gt, ast.GtE: operator.ge,
+    ast.Is: operator.is_, ast.IsNot: operator.is_not,
+    ast.In: lambda a, b: a in b, ast.NotIn: lambda a, b: a not in b
+}
+_BINARY_OPS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+    ast.Div: operator.truediv, ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod
+}
+_UNARY_OPS = {ast.USub: operator.neg, ast.UAdd: operator.pos}
+
+# Exact inverses, used to compile 'not a == b' as 'a != b'
+_NEGATED_COMPARE_OPS = {
+    ast.Eq: ast.NotEq, ast.NotEq: ast.Eq,
+    ast.Is: ast.IsNot, ast.IsNot: ast.Is,
+    ast.In: ast.NotIn, ast.NotIn: ast.In
+}
+
+
+def _cond_op(ops: Dict[type, Callable], op: ast.AST) -> Callable:
+    """Look up the function implementing a condition operator"""
+    try:
+        return ops[type(op)]
+    except KeyError:
+        raise ValueError(f"Unsupported operator in edge condition: {type(op).__name__}")
+
+
+def _compile_cond(node: ast.AST) -> Callable[[Dict[str, Any]], Any]:
+    """
+    Compile a condition expression tree into a closure over the state dict
+    
+    Only names, constants, comparisons, boolean and arithmetic operators,
+    subscripts and tuple/list literals are allowed.
+    """
+    if isinstance(node, ast.Expression):
+        return _compile_cond(node.body)
+    
+    if isinstance(node, ast.Constant):
+        value = node.value
+        return lambda data: value
+    
+    if isinstance(node, ast.Name):
+        name = node.id
+        return lambda data: data[name]
+    
+    if isinstance(node, ast.Compare):
+        if len(node.ops) == 1:
+            op = _cond_op(_COMPARE_OPS, node.ops[0])
+            left = _compile_cond(node.left)
+            right = _compile_cond(node.comparators[0])
+            return lambda data: op(left(data), right(data))
+        
+        first = _compile_cond(node.left)
+        chain = tuple(
+            (_cond_op(_COMPARE_OPS, op), _compile_cond(comparator))
+            for op, comparator in zip(node.ops, node.comparators)
+        )
+        
+        def compare_chain(data):
+            left = first(data)
+            for op, comparator in chain:
+                right = comparator(data)
+                if not op(left, right):
+                    return False
+                left = right
+            return True
+        return compare_chain
+    
+    if isinstance(node, ast.BoolOp):
+        operands = tuple(_compile_cond(value) for value in node.values)
+        if isinstance(node.op, ast.And):
+            def and_(data):
+                for operand in operands:
+                    result = operand(data)
+                    if not result:
+                        return result
+                return result
+            return and_
+        
+        def or_(data):
+            for operand in operands:
+                result = operand(data)
+                if result:
+                    return result
+            return result
+        return or_
+    
+    if isinstance(node, ast.UnaryOp):
+        if isinstance(node.op, ast.Not):
+            inner = node.operand
+            if (isinstance(inner, ast.Compare) and len(inner.ops) == 1
+                    and type(inner.ops[0]) in _NEGATED_COMPARE_OPS):
+                # Swap the comparison instead of negating its result
+                negated_op = _NEGATED_COMPARE_OPS[type(inner.ops[0])]()
+                return _compile_cond(ast.Compare(inner.left, [negated_op], inner.comparators))
+            operand = _compile_cond(inner)
+            return lambda data: not operand(data)
+        op = _cond_op(_UNARY_OPS, node.op)
+        operand = _compile_cond(node.operand)
+        return lambda data: op(operand(data))
+    
+    if isinstance(node, ast.BinOp):
+        op = _cond_op(_BINARY_OPS, node.op)
+        left = _compile_cond(node.left)
+        right = _compile_cond(node.right)
+        return lambda data: op(left(data), right(data))
+    
+    if isinstance(node, ast.Subscript):
+        value = _compile_cond(node.value)
+        key_node = node.slice
+        if isinstance(key_node, getattr(ast, 'Index', ())):
+            key_node = key_node.value  # Python 3.8 wraps subscript keys
+        key = _compile_cond(key_node)
+        return lambda data: value(data)[key(data)]
+    
+    if isinstance(node, (ast.Tuple, ast.List)):
+        elements = tuple(_compile_cond(element) for element in node.elts)
+        return lambda data: tuple(element(data) for element in elements)
+    
+    raise ValueError(f"Unsupported syntax in edge condition: {type(node).__name__}")
+
+
+# Graphs built by Graph.from_definition_cached, per registry and keyed by its
+# version and the definition hash. Registries are held weakly, so a discarded
+# registry's templates and tools are freed with it.
+_GRAPH_TEMPLATE_CACHE: 'weakref.WeakKeyDictionary[ToolRegistry, Dict[Tuple[int, bytes], Graph]]' = (
+    weakref.WeakKeyDictionary()
+)
+_GRAPH_TEMPLATE_CACHE_SIZE = 64  # Per registry
+
+# Initial states are cached as canonical JSON; types JSON cannot round-trip
+# are passed through to raise TypeError and skip the cache
+_RUN_CACHE_SIZE = 128
+_RUN_CACHE_KEY_OPTIONS = (
+    orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+    | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_PASSTHROUGH_SUBCLASS
+)
+
+
+def _copy_data(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Deep-copy plain state data"""
+    try:
+        # Pickle round-trip is much faster than deepcopy for plain data
+        return pickle.loads(pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
+    except (pickle.PicklingError, TypeError, AttributeError):
+        import copy  # Only needed for unpicklable state
+        return copy.deepcopy(data)
+
+
+# Free list of state dicts reused across runs. deque.append/pop are atomic,
+# so request threads can share it without a lock.
+_STATE_POOL: Deque[Dict[str, Any]] = deque(maxlen=64)
+
+
 class WorkflowState:
     """Manages the state that flows through the workflow"""
     
+    __slots__ = ('data', 'history')
+    
     def __init__(self, initial_state: Dict[str, Any]):
-        self.data = initial_state
+        try:
+            self.data = _STATE_POOL.pop()
+        except IndexError:
+            self.data = {}
+        self.data.update(initial_state)
         self.history: List[Dict[str, Any]] = []
     
     def get(self, key: str, default: Any = None) -> Any:
@@ -22,22 +204,93 @@ class WorkflowState:
         """Set a value in state"""
         self.data[key] = value
     
+    def increment(self, key: str, by: int = 1) -> int:
+        """Add to a numeric value in state (missing counts as 0) and return it"""
+        value = self.data.get(key, 0) + by
+        self.data[key] = value
+        return value
+    
     def update(self, updates: Dict[str, Any]) -> None:
         """Update multiple values in state"""
         self.data.update(updates)
     
     def snapshot(self) -> Dict[str, Any]:
         """Create a snapshot of current state"""
-        return copy.deepcopy(self.data)
+        return _copy_data(self.data)
+    
+    def save_snapshot(self) -> Dict[str, Any]:
+        """Save current state to history and return the saved copy"""
+        snapshot = self.snapshot()
+        self.history.append(snapshot)
+        return snapshot
+    
+    def release(self) -> None:
+        """Return the state dict to the pool; the state is unusable afterwards"""
+        data = self.data
+        self.data = None
+        self.history.clear()
+        data.clear()
+        _STATE_POOL.append(data)
+    
+    def diff(self, before: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Compare state with an earlier snapshot
+        
+        Catches every kind of write, whether returned by a tool, made through
+        set()/update() or made by changing a value in place.
+        
+        Returns:
+            tuple: (copy of the values that changed or were added, removed keys)
+        """
+        delta = {}
+        for key, value in self.data.items():
+            if key in before:
+                try:
+                    if before[key] == value:
+                        continue
+                except Exception:
+                    pass  # Incomparable values count as changed
+            delta[key] = value
+        removed = [key for key in before if key not in self.data]
+        return (_copy_data(delta) if delta else delta), removed
+    
+    @staticmethod
+    def replay(execution_log: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Yield the full state after each entry of a delta execution log"""
+        data: Dict[str, Any] = {}
+        for entry in execution_log:
+            data.update(entry['delta'])
+            for key in entry['removed']:
+                data.pop(key, None)
+            yield dict(data)
     
-    def save_snapshot(self) -> None:
-        """Save current state to history"""
-        self.history.append(self.snapshot())
+    @staticmethod
+    def materialize(execution_log: List[Dict[str, Any]], index: int) -> Dict[str, Any]:
+        """Reconstruct the full state after the execution log entry at index"""
+        data: Dict[str, Any] = {}
+        for entry in execution_log[:index + 1]:
+            data.update(entry['delta'])
+            for key in entry['removed']:
+                data.pop(key, None)
+        return data
+
+
+def _run_on_view(function: Callable, view: WorkflowState) -> Optional[Exception]:
+    """Run a node's function on its own state view, returning any error it raised"""
+    try:
+        result = function(view)
+        if result:
+            view.update(result)
+    except Exception as e:
+        return e
+    return None
 
 
 class Node:
     """Represents a node in the workflow graph"""
     
+    __slots__ = ('name', 'function', 'node_type')
+    
     def __init__(self, name: str, function: Callable, node_type: str = "function"):
         self.name = name
         self.function = function
@@ -51,15 +304,22 @@ class Node:
 class Edge:
     """Represents an edge between nodes"""
     
-    def __init__(self, from_node: str, to_node: str, condition: Optional[Callable] = None):
+    __slots__ = ('from_node', 'to_node', 'condition', 'required_keys')
+    
+    def __init__(self, from_node: str, to_node: str, condition: Optional[Callable] = None,
+                 required_keys: FrozenSet[str] = frozenset()):
         self.from_node = from_node
         self.to_node = to_node
         self.condition = condition  # Function that evaluates to True/False based on state
+        self.required_keys = required_keys  # State keys the condition always reads
     
     def should_traverse(self, state: WorkflowState) -> bool:
         """Check if this edge should be traversed"""
         if self.condition is None:
             return True
+        # A missing key would fail evaluation anyway, so skip it up front
+        if not state.data.keys() >= self.required_keys:
+            return False
         return self.condition(state)
 
 
@@ -69,8 +329,9 @@ class WorkflowEngine:
     def __init__(self):
         self.nodes: Dict[str, Node] = {}
         self.edges: List[Edge] = []
+        self._adj: Dict[str, List[Edge]] = defaultdict(list)  # Outgoing edges by from_node
         self.start_node: Optional[str] = None
-        self.end_nodes: List[str] = []
+        self.end_nodes: FrozenSet[str] = frozenset()
     
     def add_node(self, node: Node) -> None:
         """Add a node to the workflow"""
@@ -79,6 +340,7 @@ class WorkflowEngine:
     def add_edge(self, edge: Edge) -> None:
         """Add an edge to the workflow"""
         self.edges.append(edge)
+        self._adj[edge.from_node].append(edge)
     
     def set_start_node(self, node_name: str) -> None:
         """Set the starting node"""
@@ -86,20 +348,27 @@ class WorkflowEngine:
     
     def set_end_nodes(self, node_names: List[str]) -> None:
         """Set the ending nodes"""
-        self.end_nodes = node_names
+        self.end_nodes = frozenset(node_names)
+    
+    def get_next_node(self, current_node: str, state: WorkflowState) -> Optional[str]:
+        """Get the first next node whose edge can be traversed, if any"""
+        for edge in self._adj.get(current_node, ()):
+            if edge.should_traverse(state):
+                return edge.to_node
+        return None
     
     def get_next_nodes(self, current_node: str, state: WorkflowState) -> List[str]:
         """Get the next nodes to execute based on current node and state"""
-        next_nodes = []
-        for edge in self.edges:
-            if edge.from_node == current_node and edge.should_traverse(state):
-                next_nodes.append(edge.to_node)
-        return next_nodes
+        return [edge.to_node for edge in self._adj.get(current_node, ()) if edge.should_traverse(state)]
     
     def run(self, initial_state: Dict[str, Any], max_iterations: int = 100) -> tuple:
         """
         Run the workflow from start to end
         
+        Each execution log entry stores only the state keys its node changed
+        under "delta" and the keys it deleted under "removed"; use
+        WorkflowState.materialize to rebuild full state.
+        
         Returns:
             tuple: (final_state, execution_log, error)
         """
@@ -108,62 +377,66 @@ class WorkflowEngine:
         
         state = WorkflowState(initial_state)
         execution_log = []
-        visited_sequence = []  # Track node visit sequence for loop detection
         
         current_node = self.start_node
         iterations = 0
         
+        # Bind hot-loop lookups to locals
+        nodes = self.nodes
+        end_nodes = self.end_nodes
+        get_next_node = self.get_next_node
+        log_append = execution_log.append
+        time_ns = time.time_ns
+        
         try:
             while current_node and iterations < max_iterations:
                 iterations += 1
                 
                 # Check if we've reached an end node
-                if current_node in self.end_nodes:
+                if current_node in end_nodes:
                     break
                 
                 # Check if node exists
-                if current_node not in self.nodes:
+                node = nodes.get(current_node)
+                if node is None:
                     raise ValueError(f"Node '{current_node}' not found in workflow")
                 
-                # Execute current node
-                node = self.nodes[current_node]
-                state.save_snapshot()
+                # Execute current node, keeping only the state it started from
+                # (the first entry logs the full state instead)
+                before = state.snapshot() if execution_log else None
                 
                 try:
-                    result = node.execute(state)
+                    result = node.function(state)
                     if result:
                         state.update(result)
-                    
-                    # Log execution
-                    log_entry = {
-                        "node_name": current_node,
-                        "timestamp": datetime.utcnow().isoformat(),
-                        "state_snapshot": state.snapshot(),
-                        "error": None
-                    }
-                    execution_log.append(log_entry)
-                    
+                    error = None
                 except Exception as e:
-                    log_entry = {
-                        "node_name": current_node,
-                        "timestamp": datetime.utcnow().isoformat(),
-                        "state_snapshot": state.snapshot(),
-                        "error": str(e)
-                    }
-                    execution_log.append(log_entry)
-                    raise
-                
-                # Get next nodes
-                next_nodes = self.get_next_nodes(current_node, state)
+                    error = e
                 
-                if not next_nodes:
-                    # No more nodes to execute
-                    break
+                # Log execution, including any writes made before a failure
+                if execution_log:
+                    delta, removed = state.diff(before)
+                else:
+                    # First entry carries the full state as the replay base
+                    delta, removed = state.snapshot(), []
+                log_append({
+                    "node_name": current_node,
+                    "timestamp_ns": time_ns(),
+                    "delta": delta,
+                    "removed": removed,
+                    "parent_index": len(execution_log) - 1,
+                    "error": None if error is None else str(error)
+                })
+                if error is not None:
+                    raise error
                 
                 # For simplicity, take the first valid next node
                 # In a more complex system, you might handle multiple branches
-                current_node = next_nodes[0]
-                visited_sequence.append(current_node)
+                current_node = get_next_node(current_node, state)
+                
+                if current_node is None:
+                    # No more nodes to execute
+                    break
             
             if iterations >= max_iterations:
                 return state.snapshot(), execution_log, "Max iterations reached - possible infinite loop"
@@ -172,6 +445,55 @@ class WorkflowEngine:
             
         except Exception as e:
             return state.snapshot(), execution_log, str(e)
+        
+        finally:
+            state.release()
+
+
+def _reachable_indegree(start_node: Optional[str],
+                        adjacency: Mapping[str, Tuple[Edge, ...]]) -> Tuple[Dict[str, int], bool]:
+    """
+    Count incoming edges of every node reachable from the start node
+    
+    Returns:
+        tuple: (indegree by node name, whether the reachable subgraph is acyclic)
+    """
+    reachable = set()
+    stack = [start_node] if start_node else []
+    while stack:
+        name = stack.pop()
+        if name not in reachable:
+            reachable.add(name)
+            stack.extend(edge.to_node for edge in adjacency.get(name, ()))
+    
+    indegree = dict.fromkeys(reachable, 0)
+    for name in reachable:
+        for edge in adjacency.get(name, ()):
+            indegree[edge.to_node] += 1
+    
+    # Kahn's algorithm visits every node only if there is no cycle
+    remaining = dict(indegree)
+    queue = [name for name, count in remaining.items() if count == 0]
+    visited = 0
+    while queue:
+        name = queue.pop()
+        visited += 1
+        for edge in adjacency.get(name, ()):
+            remaining[edge.to_node] -= 1
+            if remaining[edge.to_node] == 0:
+                queue.append(edge.to_node)
+    
+    return indegree, visited == len(reachable)
+
+
+class CompiledGraph(NamedTuple):
+    """Frozen view of a graph's structure, built once after creation"""
+    start_node: Optional[str]
+    adjacency: Mapping[str, Tuple[Edge, ...]]
+    end_nodes: FrozenSet[str]
+    is_pure: bool  # Every node's tool is free of side effects
+    indegree: Mapping[str, int]  # Incoming edges of nodes reachable from the start
+    is_acyclic: bool
 
 
 class Graph:
@@ -182,6 +504,10 @@ class Graph:
         self.name = name
         self.description = description
         self.engine = WorkflowEngine()
+        self.edge_count = 0  # Edges in the definition, including never-traversed ones
+        self._compiled: Optional[CompiledGraph] = None
+        self._run_cache: Optional['OrderedDict[bytes, tuple]'] = None  # Pure graphs only
+        self._run_cache_lock = threading.Lock()
     
     @classmethod
     def create_from_definition(cls, graph_def: Dict[str, Any], tool_registry: 'ToolRegistry') -> 'Graph':
@@ -189,9 +515,10 @@ class Graph:
         graph_id = str(uuid.uuid4())
         graph = cls(graph_id, graph_def['name'], graph_def.get('description', ''))
         
-        # Add nodes
+        # Add nodes, resolving tools straight from the registry's dict
+        tools = tool_registry.tools
         for node_def in graph_def['nodes']:
-            function = tool_registry.get_tool(node_def['function_name'])
+            function = tools.get(node_def['function_name'])
             if not function:
                 raise ValueError(f"Tool '{node_def['function_name']}' not found in registry")
             
@@ -199,32 +526,296 @@ class Graph:
             graph.engine.add_node(node)
         
         # Add edges
+        graph.edge_count = len(graph_def['edges'])
         for edge_def in graph_def['edges']:
             condition = None
+            required_keys = frozenset()
             if edge_def.get('condition'):
-                # Create a condition function from the expression
-                condition = cls._create_condition_function(edge_def['condition'])
+                folded = cls._fold_condition(edge_def['condition'])
+                if folded is False:
+                    # Edge can never be traversed
+                    continue
+                if folded is None:
+                    # Create a condition function from the expression
+                    condition = cls._create_condition_function(edge_def['condition'])
+                    required_keys = cls._condition_names(edge_def['condition'])
             
-            edge = Edge(edge_def['from_node'], edge_def['to_node'], condition)
+            edge = Edge(edge_def['from_node'], edge_def['to_node'], condition, required_keys)
             graph.engine.add_edge(edge)
         
         # Set start and end nodes
         graph.engine.set_start_node(graph_def['start_node'])
         graph.engine.set_end_nodes(graph_def.get('end_nodes', []))
         
+        graph.compile(tool_registry)
+        return graph
+    
+    @classmethod
+    def from_definition_cached(cls, graph_def: Dict[str, Any], tool_registry: 'ToolRegistry') -> 'Graph':
+        """
+        Create a graph from a definition, reusing the structure of an identical one
+        
+        Graphs are cached per registry on a hash of the canonical JSON
+        definition and the registry's version; each call returns a clone with
+        a fresh graph ID. Read-only definitions (MappingProxyType) are accepted.
+        """
+        payload = orjson.dumps(graph_def, default=dict, option=orjson.OPT_SORT_KEYS)
+        key = (tool_registry.version, hashlib.blake2b(payload, digest_size=16).digest())
+        templates = _GRAPH_TEMPLATE_CACHE.get(tool_registry)
+        if templates is None:
+            templates = _GRAPH_TEMPLATE_CACHE.setdefault(tool_registry, {})
+        template = templates.get(key)
+        if template is None:
+            template = cls.create_from_definition(graph_def, tool_registry)
+            if len(templates) >= _GRAPH_TEMPLATE_CACHE_SIZE:
+                # Evict the oldest template
+                del templates[next(iter(templates))]
+            templates[key] = template
+        return template._clone()
+    
+    def _clone(self) -> 'Graph':
+        """Copy this graph under a new ID, sharing its structure and run cache"""
+        # Runs never modify the engine, so sharing it is safe
+        graph = Graph(str(uuid.uuid4()), self.name, self.description)
+        graph.engine = self.engine
+        graph.edge_count = self.edge_count
+        graph._compiled = self._compiled
+        graph._run_cache = self._run_cache
+        graph._run_cache_lock = self._run_cache_lock
         return graph
     
+    def compile(self, tool_registry: 'ToolRegistry') -> CompiledGraph:
+        """
+        Freeze the graph structure for repeated runs
+        
+        When every node uses a pure tool, runs are memoized on the initial
+        state, so the graph must not be modified after compiling.
+        """
+        engine = self.engine
+        is_pure = all(tool_registry.is_pure(node.function) for node in engine.nodes.values())
+        adjacency = MappingProxyType({name: tuple(edges) for name, edges in engine._adj.items()})
+        indegree, is_acyclic = _reachable_indegree(engine.start_node, adjacency)
+        self._compiled = CompiledGraph(
+            start_node=engine.start_node,
+            adjacency=adjacency,
+            end_nodes=engine.end_nodes,
+            is_pure=is_pure,
+            indegree=MappingProxyType(indegree),
+            is_acyclic=is_acyclic
+        )
+        self._run_cache = OrderedDict() if is_pure else None
+        return self._compiled
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def _parse_condition(condition_expr: str) -> ast.Expression:
+        """Parse a condition expression into an AST"""
+        try:
+            return ast.parse(condition_expr, mode='eval')
+        except SyntaxError as e:
+            raise ValueError(f"Invalid edge condition '{condition_expr}': {e.msg}")
+    
+    @staticmethod
+    def _fold_condition(condition_expr: str) -> Optional[bool]:
+        """
+        Evaluate a condition that does not depend on state
+        
+        Returns:
+            The constant truth value, or None if the condition reads state
+        """
+        tree = Graph._parse_condition(condition_expr)
+        if not all(isinstance(node, _FOLDABLE_NODES) for node in ast.walk(tree)):
+            return None
+        condition = _compile_cond(tree)
+        try:
+            return bool(condition({}))
+        except Exception:
+            # Same outcome as a failing condition at run time
+            return False
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def _condition_names(condition_expr: str) -> FrozenSet[str]:
+        """
+        Collect the state keys a condition always reads
+        
+        Keys read only after an and/or or a chained comparison may be skipped
+        by short-circuiting, so they are left out.
+        """
+        names = set()
+        stack = [Graph._parse_condition(condition_expr).body]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, ast.Name):
+                names.add(node.id)
+            elif isinstance(node, ast.BoolOp):
+                stack.append(node.values[0])
+            elif isinstance(node, ast.Compare):
+                stack.extend((node.left, node.comparators[0]))
+            else:
+                stack.extend(ast.iter_child_nodes(node))
+        return frozenset(names)
+    
     @staticmethod
+    @functools.lru_cache(maxsize=None)
     def _create_condition_function(condition_expr: str) -> Callable:
         """Create a condition function from a string expression"""
+        # Compile once so each traversal skips parsing the expression
+        condition = _compile_cond(Graph._parse_condition(condition_expr))
+        
         def condition_fn(state: WorkflowState) -> bool:
             try:
-                # Evaluate the expression with state data as local variables
-                return eval(condition_expr, {"__builtins__": {}}, state.data)
+                # Evaluate the expression with state data as variables
+                return condition(state.data)
             except Exception:
                 return False
         return condition_fn
     
     def run(self, initial_state: Dict[str, Any]) -> tuple:
-        """Run the graph with the given initial state"""
-        return self.engine.run(initial_state)
+        """
+        Run the graph with the given initial state
+        
+        Runs of pure graphs are memoized on the initial state. Every call
+        gets its own copy of the result, with log timestamps moved to the
+        time of the call.
+        """
+        cache = self._run_cache
+        if cache is None:
+            return self.engine.run(initial_state)
+        try:
+            payload = orjson.dumps(initial_state, option=_RUN_CACHE_KEY_OPTIONS)
+        except TypeError:
+            return self.engine.run(initial_state)
+        if orjson.loads(payload) != initial_state:
+            # JSON changed the state (NaN, infinities, tuples), so it is no key
+            return self.engine.run(initial_state)
+        
+        with self._run_cache_lock:
+            cached = cache.get(payload)
+            if cached is not None:
+                cache.move_to_end(payload)
+        
+        if cached is None:
+            result = self.engine.run(initial_state)
+            with self._run_cache_lock:
+                cache[payload] = _copy_data(result)
+                if len(cache) > _RUN_CACHE_SIZE:
+                    cache.popitem(last=False)  # Evict the least recently used
+            return result
+        
+        final_state, execution_log, error = _copy_data(cached)
+        if execution_log:
+            # Keep the steps' relative timing, starting now
+            shift = time.time_ns() - execution_log[0]['timestamp_ns']
+            for entry in execution_log:
+                entry['timestamp_ns'] += shift
+        return final_state, execution_log, error
+    
+    def run_concurrent(self, initial_state: Dict[str, Any], max_workers: Optional[int] = None) -> tuple:
+        """
+        Run an acyclic graph, executing independent nodes at the same time
+        
+        Unlike run(), every traversable outgoing edge is followed. A node runs
+        once all of its incoming edges are resolved and at least one was
+        taken. Nodes in the same wave run in a thread pool (a wave of one runs
+        inline), each on its own copy of the state, and their changes are
+        merged in order before any edge is evaluated, so when siblings write
+        the same key the later one wins. If a node fails, its whole wave is
+        still merged and logged before the run stops.
+        
+        Returns:
+            tuple: (final_state, execution_log, error)
+        """
+        compiled = self._compiled
+        if compiled is None or not compiled.is_acyclic:
+            return {}, [], "Concurrent runs require a compiled, acyclic graph"
+        if not compiled.start_node:
+            return {}, [], "No start node defined"
+        
+        nodes = self.engine.nodes
+        end_nodes = compiled.end_nodes
+        adjacency = compiled.adjacency
+        state = WorkflowState(initial_state)
+        execution_log = []
+        pending = dict(compiled.indegree)  # Unresolved incoming edges per node
+        activated = {compiled.start_node}  # Nodes with at least one taken incoming edge
+        ready = [compiled.start_node]
+        
+        pool = None
+        try:
+            while ready:
+                # End nodes stop their branch without executing
+                batch = [name for name in ready if name not in end_nodes]
+                for name in batch:
+                    if name not in nodes:
+                        raise ValueError(f"Node '{name}' not found in workflow")
+                # Each node works on its own copy of the state, so its writes
+                # can be told apart from its siblings' and never race them
+                base = state.snapshot()
+                views = [WorkflowState(_copy_data(base)) for _ in batch]
+                functions = [nodes[name].function for name in batch]
+                
+                try:
+                    if len(batch) > 1:
+                        if pool is None:
+                            # Only loaded once a wave has siblings to run together
+                            from concurrent.futures import ThreadPoolExecutor
+                            pool = ThreadPoolExecutor(max_workers)
+                        errors = list(pool.map(_run_on_view, functions, views))
+                    else:
+                        errors = [_run_on_view(function, view) for function, view in zip(functions, views)]
+                    
+                    # Every node in the wave has finished, so all are merged and
+                    # logged before the first error is raised
+                    for name, view, error in zip(batch, views, errors):
+                        # Merge in wave order; a later sibling's write to the same key wins
+                        delta, removed = view.diff(base)
+                        for key in delta:
+                            state.data[key] = view.data[key]
+                        for key in removed:
+                            state.data.pop(key, None)
+                        
+                        if not execution_log:
+                            # First entry carries the full state as the replay base
+                            delta, removed = state.snapshot(), []
+                        execution_log.append({
+                            "node_name": name,
+                            "timestamp_ns": time.time_ns(),
+                            "delta": delta,
+                            "removed": removed,
+                            "parent_index": len(execution_log) - 1,
+                            "error": None if error is None else str(error)
+                        })
+                    for error in errors:
+                        if error is not None:
+                            raise error
+                finally:
+                    for view in views:
+                        view.release()
+                
+                # Resolve outgoing edges; skipped nodes resolve theirs as not taken
+                next_ready = []
+                resolved = list(ready)
+                while resolved:
+                    name = resolved.pop()
+                    follow = name in activated and name not in end_nodes
+                    for edge in adjacency.get(name, ()):
+                        if follow and edge.should_traverse(state):
+                            activated.add(edge.to_node)
+                        pending[edge.to_node] -= 1
+                        if pending[edge.to_node] == 0:
+                            if edge.to_node in activated:
+                                next_ready.append(edge.to_node)
+                            else:
+                                resolved.append(edge.to_node)
+                ready = next_ready
+            
+            return state.snapshot(), execution_log, None
+        
+        except Exception as e:
+            return state.snapshot(), execution_log, str(e)
+        
+        finally:
+            if pool is not None:
+                pool.shutdown()
+            state.release()
@@ -1,23 +1,146 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
-from typing import Dict, Any
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
+from typing import Dict, Any, Iterator, List, Literal, Optional, Tuple
+import hashlib
 import uuid
 
+import orjson
+
 from app.models import (
     GraphCreate, GraphRunRequest, GraphRunResponse, 
-    GraphStateResponse, ExecutionLogEntry
+    GraphStateResponse, ExecutionLogEntry, format_timestamp
 )
-from app.engine import Graph
+from app.engine import Graph, WorkflowState
 from app.tools import tool_registry
 from app.storage import storage
 
 app = FastAPI(
     title="Workflow Engine API",
     description="A minimal workflow/graph engine similar to LangGraph",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 
+# Log timestamps are epoch nanoseconds unless a request asks for ?format=iso
+TimestampFormat = Literal["ns", "iso"]
+
+
+def _build_log_entries(execution_log: List[Dict[str, Any]],
+                       timestamp_format: TimestampFormat = "ns") -> List[ExecutionLogEntry]:
+    """Convert a delta execution log into entries with full state snapshots"""
+    iso = timestamp_format == "iso"
+    # Entries are built from engine output, so skip Pydantic validation
+    return [
+        ExecutionLogEntry.model_construct(
+            node_name=entry['node_name'],
+            timestamp=format_timestamp(entry['timestamp_ns']) if iso else entry['timestamp_ns'],
+            state_snapshot=state_snapshot,
+            error=entry['error']
+        )
+        for entry, state_snapshot in zip(execution_log, WorkflowState.replay(execution_log))
+    ]
+
+
+# Same key handling as ORJSONResponse, one document per line
+_NDJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE
+
+
+def _ndjson_run_lines(run_id: str, graph_id: str, status: str, final_state: Dict[str, Any],
+                      execution_log: List[Dict[str, Any]], error: Optional[str],
+                      timestamp_format: TimestampFormat) -> Iterator[bytes]:
+    """Yield a run as NDJSON: one line per log entry, then one with the outcome"""
+    iso = timestamp_format == "iso"
+    # Snapshots are rebuilt one entry at a time as lines are written
+    for entry, state_snapshot in zip(execution_log, WorkflowState.replay(execution_log)):
+        yield orjson.dumps({
+            "type": "log",
+            "entry": {
+                "node_name": entry['node_name'],
+                "timestamp": format_timestamp(entry['timestamp_ns']) if iso else entry['timestamp_ns'],
+                "state_snapshot": state_snapshot,
+                "error": entry['error']
+            }
+        }, option=_NDJSON_OPTIONS)
+    yield orjson.dumps({
+        "type": "final",
+        "run_id": run_id,
+        "graph_id": graph_id,
+        "status": status,
+        "final_state": final_state,
+        "error": error
+    }, option=_NDJSON_OPTIONS)
+
+
+async def _execute_run(request: GraphRunRequest) -> Tuple[
+        str, str, Dict[str, Any], List[Dict[str, Any]], Optional[str]]:
+    """
+    Run a stored graph and record the run
+    
+    Returns:
+        tuple: (run_id, status, final_state, execution_log, error)
+    """
+    # Get graph
+    graph = storage.get_graph(request.graph_id)
+    if not graph:
+        raise HTTPException(status_code=404, detail=f"Graph {request.graph_id} not found")
+    
+    # Generate run ID
+    run_id = str(uuid.uuid4())
+    
+    # Initialize run
+    storage.register_run(run_id, request.graph_id)
+    
+    # Run the graph in a worker thread so it doesn't block the event loop
+    runner = graph.run_concurrent if request.concurrent else graph.run
+    final_state, execution_log, error = await run_in_threadpool(runner, request.initial_state)
+    
+    # Determine status
+    status = "failed" if error else "completed"
+    
+    # Save run results
+    storage.finalize_run(
+        run_id=run_id,
+        status=status,
+        state=final_state,
+        execution_log=execution_log,
+        error=error
+    )
+    return run_id, status, final_state, execution_log, error
+
+
+# Serialized /graphs body as (graph_version, body, etag, count)
+_graph_list_cache: Tuple[int, bytes, str, int] = (-1, b"", "", 0)
+
+
+def _graph_list() -> Tuple[bytes, str, int]:
+    """Get the serialized graph list, rebuilding it only after graphs change"""
+    global _graph_list_cache
+    version, body, etag, count = _graph_list_cache
+    if version != storage.graph_version:
+        version = storage.graph_version
+        graphs_info = []
+        
+        for graph_id in storage.list_graphs():
+            graph = storage.get_graph(graph_id)
+            if graph is None:
+                continue  # Deleted since listing
+            graphs_info.append({
+                "graph_id": graph_id,
+                "name": graph.name,
+                "description": graph.description,
+                "node_count": len(graph.engine.nodes),
+                "edge_count": graph.edge_count
+            })
+        
+        count = len(graphs_info)
+        body = orjson.dumps({"count": count, "graphs": graphs_info})
+        etag = f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+        _graph_list_cache = (version, body, etag, count)
+    return body, etag, count
+
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -27,8 +150,10 @@ async def root():
         "endpoints": {
             "create_graph": "POST /graph/create",
             "run_graph": "POST /graph/run",
+            "run_graph_stream": "POST /graph/run/stream",
             "get_state": "GET /graph/state/{run_id}",
             "list_graphs": "GET /graphs",
+            "count_graphs": "HEAD /graphs",
             "list_tools": "GET /tools"
         }
     }
@@ -57,7 +182,7 @@ async def create_graph(graph_def: GraphCreate) -> Dict[str, Any]:
         }
         
         # Create graph from definition
-        graph = Graph.create_from_definition(graph_dict, tool_registry)
+        graph = Graph.from_definition_cached(graph_dict, tool_registry)
         
         # Save graph
         graph_id = storage.save_graph(graph)
@@ -77,56 +202,27 @@ async def create_graph(graph_def: GraphCreate) -> Dict[str, Any]:
 
 
 @app.post("/graph/run")
-async def run_graph(request: GraphRunRequest) -> GraphRunResponse:
+async def run_graph(
+    request: GraphRunRequest,
+    timestamp_format: TimestampFormat = Query("ns", alias="format")
+) -> GraphRunResponse:
     """
     Run a workflow graph with given initial state
     
     Args:
         request: Graph run request with graph_id and initial_state
+        timestamp_format: "iso" to format log timestamps, default epoch nanoseconds
     
     Returns:
         GraphRunResponse with final state and execution log
     """
     try:
-        # Get graph
-        graph = storage.get_graph(request.graph_id)
-        if not graph:
-            raise HTTPException(status_code=404, detail=f"Graph {request.graph_id} not found")
-        
-        # Generate run ID
-        run_id = str(uuid.uuid4())
-        
-        # Initialize run
-        storage.save_run(
-            run_id=run_id,
-            graph_id=request.graph_id,
-            status="running",
-            state=request.initial_state,
-            execution_log=[]
-        )
-        
-        # Run the graph
-        final_state, execution_log, error = graph.run(request.initial_state)
-        
-        # Determine status
-        status = "failed" if error else "completed"
-        
-        # Save run results
-        storage.save_run(
-            run_id=run_id,
-            graph_id=request.graph_id,
-            status=status,
-            state=final_state,
-            execution_log=execution_log,
-            error=error
-        )
+        run_id, status, final_state, execution_log, error = await _execute_run(request)
         
         # Convert execution log to Pydantic models
-        log_entries = [
-            ExecutionLogEntry(**entry) for entry in execution_log
-        ]
+        log_entries = _build_log_entries(execution_log, timestamp_format)
         
-        return GraphRunResponse(
+        return GraphRunResponse.model_construct(
             run_id=run_id,
             graph_id=request.graph_id,
             status=status,
@@ -141,13 +237,43 @@ async def run_graph(request: GraphRunRequest) -> GraphRunResponse:
         raise HTTPException(status_code=500, detail=f"Failed to run graph: {str(e)}")
 
 
+@app.post("/graph/run/stream")
+async def run_graph_stream(
+    request: GraphRunRequest,
+    timestamp_format: TimestampFormat = Query("ns", alias="format")
+) -> StreamingResponse:
+    """
+    Run a workflow graph, streaming the result as newline-delimited JSON
+    
+    Each execution log entry is sent as a {"type": "log", "entry": ...} line,
+    followed by a {"type": "final", ...} line with the run's outcome, so
+    clients can process large logs one entry at a time.
+    """
+    try:
+        run_id, status, final_state, execution_log, error = await _execute_run(request)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to run graph: {str(e)}")
+    
+    return StreamingResponse(
+        _ndjson_run_lines(run_id, request.graph_id, status, final_state,
+                          execution_log, error, timestamp_format),
+        media_type="application/x-ndjson"
+    )
+
+
 @app.get("/graph/state/{run_id}")
-async def get_run_state(run_id: str) -> GraphStateResponse:
+async def get_run_state(
+    run_id: str,
+    timestamp_format: TimestampFormat = Query("ns", alias="format")
+) -> GraphStateResponse:
     """
     Get the current state of a workflow run
     
     Args:
         run_id: ID of the run
+        timestamp_format: "iso" to format log timestamps, default epoch nanoseconds
     
     Returns:
         GraphStateResponse with current state and execution log
@@ -158,15 +284,13 @@ async def get_run_state(run_id: str) -> GraphStateResponse:
             raise HTTPException(status_code=404, detail=f"Run {run_id} not found")
         
         # Convert execution log to Pydantic models
-        log_entries = [
-            ExecutionLogEntry(**entry) for entry in run['execution_log']
-        ]
+        log_entries = _build_log_entries(run.execution_log, timestamp_format)
         
-        return GraphStateResponse(
-            run_id=run['run_id'],
-            graph_id=run['graph_id'],
-            status=run['status'],
-            current_state=run['state'],
+        return GraphStateResponse.model_construct(
+            run_id=run.run_id,
+            graph_id=run.graph_id,
+            status=run.status,
+            current_state=run.state,
             execution_log=log_entries
         )
     
@@ -177,29 +301,28 @@ async def get_run_state(run_id: str) -> GraphStateResponse:
 
 
 @app.get("/graphs")
-async def list_graphs() -> Dict[str, Any]:
-    """List all created graphs"""
-    try:
-        graph_ids = storage.list_graphs()
-        graphs_info = []
-        
-        for graph_id in graph_ids:
-            graph = storage.get_graph(graph_id)
-            graphs_info.append({
-                "graph_id": graph_id,
-                "name": graph.name,
-                "description": graph.description,
-                "node_count": len(graph.engine.nodes),
-                "edge_count": len(graph.engine.edges)
-            })
-        
-        return {
-            "count": len(graphs_info),
-            "graphs": graphs_info
-        }
+async def list_graphs(request: Request) -> Response:
+    """
+    List all created graphs
     
+    The response carries an ETag; sending it back in If-None-Match gets an
+    empty 304 response while the graphs are unchanged.
+    """
+    try:
+        body, etag, count = _graph_list()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to list graphs: {str(e)}")
+    
+    headers = {"ETag": etag, "X-Graph-Count": str(count)}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.head("/graphs")
+async def count_graphs() -> Response:
+    """Get the number of graphs in the X-Graph-Count header, without listing them"""
+    return Response(headers={"X-Graph-Count": str(storage.graph_count())})
 
 
 @app.get("/runs")
@@ -211,11 +334,11 @@ async def list_runs(graph_id: str = None) -> Dict[str, Any]:
         # Simplify run info
         runs_info = [
             {
-                "run_id": run['run_id'],
-                "graph_id": run['graph_id'],
-                "status": run['status'],
-                "created_at": run['created_at'],
-                "updated_at": run['updated_at']
+                "run_id": run.run_id,
+                "graph_id": run.graph_id,
+                "status": run.status,
+                "created_at": run.created_at,
+                "updated_at": run.updated_at
             }
             for run in runs
         ]
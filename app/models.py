@@ -1,8 +1,22 @@
-from pydantic import BaseModel, Field
-from typing import Dict, Any, Optional, List
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Dict, Any, Optional, List, Union
+from datetime import datetime, timedelta
 from enum import Enum
 
 
+_EPOCH = datetime(1970, 1, 1)
+
+
+def format_timestamp(timestamp_ns: int) -> str:
+    """Format epoch nanoseconds as a UTC ISO timestamp"""
+    return (_EPOCH + timedelta(microseconds=timestamp_ns // 1000)).isoformat()
+
+
+class _LazyModel(BaseModel):
+    """Base model that builds its validation schema on first use, not at import"""
+    model_config = ConfigDict(defer_build=True)
+
+
 class NodeType(str, Enum):
     """Type of node in the workflow"""
     FUNCTION = "function"
@@ -16,7 +30,7 @@ class EdgeType(str, Enum):
     CONDITIONAL = "conditional"
 
 
-class NodeDefinition(BaseModel):
+class NodeDefinition(_LazyModel):
     """Definition of a node in the workflow"""
     name: str
     type: NodeType = NodeType.FUNCTION
@@ -24,7 +38,7 @@ class NodeDefinition(BaseModel):
     description: Optional[str] = None
 
 
-class EdgeDefinition(BaseModel):
+class EdgeDefinition(_LazyModel):
     """Definition of an edge between nodes"""
     from_node: str
     to_node: str
@@ -32,7 +46,7 @@ class EdgeDefinition(BaseModel):
     condition: Optional[str] = None  # Python expression evaluated on state
 
 
-class GraphDefinition(BaseModel):
+class GraphDefinition(_LazyModel):
     """Complete graph definition"""
     name: str
     description: Optional[str] = None
@@ -42,7 +56,7 @@ class GraphDefinition(BaseModel):
     end_nodes: List[str] = Field(default_factory=list)
 
 
-class GraphCreate(BaseModel):
+class GraphCreate(_LazyModel):
     """Request model for creating a graph"""
     name: str
     description: Optional[str] = None
@@ -52,21 +66,22 @@ class GraphCreate(BaseModel):
     end_nodes: List[str] = Field(default_factory=list)
 
 
-class GraphRunRequest(BaseModel):
+class GraphRunRequest(_LazyModel):
     """Request model for running a graph"""
     graph_id: str
     initial_state: Dict[str, Any]
+    concurrent: bool = False  # Run independent nodes in parallel (acyclic graphs only)
 
 
-class ExecutionLogEntry(BaseModel):
+class ExecutionLogEntry(_LazyModel):
     """Single entry in execution log"""
     node_name: str
-    timestamp: str
+    timestamp: Union[int, str]  # Epoch nanoseconds, or an ISO string with ?format=iso
     state_snapshot: Dict[str, Any]
     error: Optional[str] = None
 
 
-class GraphRunResponse(BaseModel):
+class GraphRunResponse(_LazyModel):
     """Response model for graph execution"""
     run_id: str
     graph_id: str
@@ -76,7 +91,7 @@ class GraphRunResponse(BaseModel):
     error: Optional[str] = None
 
 
-class GraphStateResponse(BaseModel):
+class GraphStateResponse(_LazyModel):
     """Response model for getting run state"""
     run_id: str
     graph_id: str
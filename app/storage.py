@@ -1,20 +1,48 @@
-from typing import Dict, Any
-import uuid
+from typing import Dict, Any, List, Optional
+from collections import defaultdict
+from dataclasses import dataclass
+import threading
 from datetime import datetime
 from app.engine import Graph
-from app.models import ExecutionLogEntry
+
+
+@dataclass
+class RunRecord:
+    """A stored workflow run"""
+    # Declared by hand rather than with slots=True to keep Python 3.8 support
+    __slots__ = (
+        'run_id', 'graph_id', 'status', 'state', 'execution_log',
+        'error', 'created_at', 'updated_at'
+    )
+    run_id: str
+    graph_id: str
+    status: str
+    state: Dict[str, Any]
+    execution_log: list
+    error: Optional[str]
+    created_at: str
+    updated_at: str
 
 
 class Storage:
-    """In-memory storage for graphs and runs"""
+    """
+    In-memory storage for graphs and runs
+    
+    Access is guarded by a lock since graph runs execute in worker threads.
+    """
     
     def __init__(self):
         self.graphs: Dict[str, Graph] = {}
-        self.runs: Dict[str, Dict[str, Any]] = {}
+        self.runs: Dict[str, RunRecord] = {}
+        self._runs_by_graph: Dict[str, List[str]] = defaultdict(list)  # graph_id -> run IDs
+        self._lock = threading.Lock()
+        self.graph_version = 0  # Bumped when graphs are saved or deleted
     
     def save_graph(self, graph: Graph) -> str:
         """Save a graph and return its ID"""
-        self.graphs[graph.graph_id] = graph
+        with self._lock:
+            self.graphs[graph.graph_id] = graph
+            self.graph_version += 1
         return graph.graph_id
     
     def get_graph(self, graph_id: str) -> Graph:
@@ -23,50 +51,92 @@ class Storage:
     
     def list_graphs(self) -> list:
         """List all graph IDs"""
-        return list(self.graphs.keys())
+        with self._lock:
+            return list(self.graphs.keys())
+    
+    def graph_count(self) -> int:
+        """Get the number of stored graphs"""
+        return len(self.graphs)
     
     def delete_graph(self, graph_id: str) -> bool:
         """Delete a graph"""
-        if graph_id in self.graphs:
-            del self.graphs[graph_id]
-            return True
-        return False
+        with self._lock:
+            if graph_id in self.graphs:
+                del self.graphs[graph_id]
+                self.graph_version += 1
+                return True
+            return False
     
     def save_run(self, run_id: str, graph_id: str, status: str, 
                  state: Dict[str, Any], execution_log: list, error: str = None) -> None:
         """Save a run result"""
-        self.runs[run_id] = {
-            'run_id': run_id,
-            'graph_id': graph_id,
-            'status': status,
-            'state': state,
-            'execution_log': execution_log,
-            'error': error,
-            'created_at': datetime.utcnow().isoformat(),
-            'updated_at': datetime.utcnow().isoformat()
-        }
+        now = datetime.utcnow().isoformat()
+        with self._lock:
+            existing = self.runs.get(run_id)
+            if existing is None:
+                self._runs_by_graph[graph_id].append(run_id)
+            self.runs[run_id] = RunRecord(
+                run_id=run_id,
+                graph_id=graph_id,
+                status=status,
+                state=state,
+                execution_log=execution_log,
+                error=error,
+                created_at=existing.created_at if existing else now,
+                updated_at=now
+            )
+    
+    def register_run(self, run_id: str, graph_id: str) -> None:
+        """Record a run that has started, before its state is known"""
+        now = datetime.utcnow().isoformat()
+        with self._lock:
+            self._runs_by_graph[graph_id].append(run_id)
+            self.runs[run_id] = RunRecord(
+                run_id=run_id,
+                graph_id=graph_id,
+                status="running",
+                state={},
+                execution_log=[],
+                error=None,
+                created_at=now,
+                updated_at=now
+            )
+    
+    def finalize_run(self, run_id: str, status: str, state: Dict[str, Any],
+                     execution_log: list, error: str = None) -> None:
+        """Store the outcome of a run created with register_run"""
+        with self._lock:
+            run = self.runs[run_id]
+            run.status = status
+            run.state = state
+            run.execution_log = execution_log
+            run.error = error
+            run.updated_at = datetime.utcnow().isoformat()
     
-    def get_run(self, run_id: str) -> Dict[str, Any]:
+    def get_run(self, run_id: str) -> Optional[RunRecord]:
         """Get a run by ID"""
         return self.runs.get(run_id)
     
-    def list_runs(self, graph_id: str = None) -> list:
+    def list_runs(self, graph_id: str = None) -> List[RunRecord]:
         """List all runs, optionally filtered by graph_id"""
-        if graph_id:
-            return [run for run in self.runs.values() if run['graph_id'] == graph_id]
-        return list(self.runs.values())
+        with self._lock:
+            if graph_id:
+                return [self.runs[run_id] for run_id in self._runs_by_graph.get(graph_id, ())]
+            return list(self.runs.values())
     
     def update_run_status(self, run_id: str, status: str, 
                          state: Dict[str, Any] = None, 
                          execution_log: list = None) -> None:
         """Update run status"""
-        if run_id in self.runs:
-            self.runs[run_id]['status'] = status
-            self.runs[run_id]['updated_at'] = datetime.utcnow().isoformat()
-            if state:
-                self.runs[run_id]['state'] = state
-            if execution_log:
-                self.runs[run_id]['execution_log'] = execution_log
+        with self._lock:
+            run = self.runs.get(run_id)
+            if run is not None:
+                run.status = status
+                run.updated_at = datetime.utcnow().isoformat()
+                if state:
+                    run.state = state
+                if execution_log:
+                    run.execution_log = execution_log
 
 
 # Global storage instance
@@ -1,16 +1,112 @@
-from typing import Dict, Callable, Optional, Any
-from app.engine import WorkflowState
+from typing import Dict, Callable, Optional, Any, List, Set, NamedTuple, Sequence, Tuple
+from collections import OrderedDict
+import ast
+import functools
+import hashlib
+import re
+import threading
+import orjson
+from app.engine import WorkflowState, _copy_data, _RUN_CACHE_KEY_OPTIONS
+
+
+def _memoize(function: Callable, reads: Sequence[str], maxsize: int = 128) -> Callable:
+    """
+    Cache a tool's effect on the values of the state keys it reads
+    
+    Both the returned updates and any writes the tool makes to state
+    directly are cached, and a cache hit replays both. Everything is
+    copied in and out of the cache so later tools cannot modify cached
+    values. States whose inputs JSON cannot encode are passed straight
+    to the tool.
+    """
+    reads = tuple(reads)
+    cache: 'OrderedDict[bytes, tuple]' = OrderedDict()
+    lock = threading.Lock()
+    
+    @functools.wraps(function)
+    def memoized(state: WorkflowState) -> Any:
+        data = state.data
+        try:
+            payload = orjson.dumps(
+                {key: data[key] for key in reads if key in data},
+                option=_RUN_CACHE_KEY_OPTIONS
+            )
+        except TypeError:
+            return function(state)
+        key = hashlib.blake2b(payload, digest_size=16).digest()
+        
+        with lock:
+            entry = cache.get(key)
+            if entry is not None:
+                cache.move_to_end(key)
+        if entry is not None:
+            result, written, removed = entry
+            data.update(_copy_data(written))
+            for name in removed:
+                data.pop(name, None)
+            return _copy_data(result)
+        
+        before = state.snapshot()
+        result = function(state)
+        written, removed = state.diff(before)  # Writes made through state itself
+        with lock:
+            cache[key] = (_copy_data(result), written, removed)
+            if len(cache) > maxsize:
+                cache.popitem(last=False)  # Evict the least recently used
+        return result
+    
+    memoized.reads = reads
+    return memoized
 
 
 class ToolRegistry:
-    """Registry for managing workflow tools (functions)"""
+    """
+    Registry for managing workflow tools (functions)
+    
+    A tool receives the WorkflowState and returns a dict of updates to merge
+    into it. Tools that only change a key or two can instead write through
+    state.set()/state.increment() and return None, which avoids building
+    an update dict.
+    """
     
     def __init__(self):
         self.tools: Dict[str, Callable] = {}
+        self.pure_tools: Set[str] = set()
+        self.version = 0  # Bumped on every change, invalidates cached graphs
     
-    def register(self, name: str, function: Callable) -> None:
-        """Register a tool function"""
+    def register(self, name: str, function: Callable, reads: Optional[Sequence[str]] = None) -> None:
+        """
+        Register a tool function
+        
+        If reads lists every state key the tool uses, its results are
+        memoized on their values, so calls on unchanged inputs (such as
+        repeated loop iterations) skip the work. Memoizing assumes the tool
+        is pure, so listing reads also registers it as pure.
+        """
+        if reads is not None:
+            function = _memoize(function, reads)
+            self.pure_tools.add(name)
+        else:
+            self.pure_tools.discard(name)
         self.tools[name] = function
+        self.version += 1
+    
+    def register_pure(self, *names: str) -> None:
+        """
+        Mark registered tools as pure
+        
+        A pure tool's result depends only on the state it is given and it has
+        no side effects, so runs of graphs made only of pure tools can be cached.
+        """
+        for name in names:
+            if name not in self.tools:
+                raise ValueError(f"Tool '{name}' not found in registry")
+            self.pure_tools.add(name)
+        self.version += 1
+    
+    def is_pure(self, function: Callable) -> bool:
+        """Check whether a function is registered as a pure tool"""
+        return any(self.tools[name] is function for name in self.pure_tools)
     
     def get_tool(self, name: str) -> Optional[Callable]:
         """Get a registered tool"""
@@ -24,6 +120,8 @@ class ToolRegistry:
         """Unregister a tool"""
         if name in self.tools:
             del self.tools[name]
+            self.pure_tools.discard(name)
+            self.version += 1
             return True
         return False
 
@@ -36,32 +134,106 @@ tool_registry = ToolRegistry()
 # Example Tools for Code Review Workflow
 # ============================================
 
+# Patterns shared by the code analysis tools, compiled once at import
+_LONG_LINE_RE = re.compile(r'^.{101,}$', re.MULTILINE)
+# Source lines as the parser numbers them, with line endings kept. Unlike
+# str.splitlines, form feeds and other separators do not end a line.
+_SOURCE_LINE_RE = re.compile(r'[^\r\n]*(?:\r\n|\r|\n)|[^\r\n]+\Z')
+
+# Suggestion for each issue type reported by detect_issues
+_SUGGESTION_MAP = {
+    'bare_except': 'Specify exception types in except clauses',
+    'security': 'Remove eval() and use safer alternatives like ast.literal_eval()',
+    'naming': 'Rename functions to follow PEP 8 naming conventions',
+    'style': 'Break long lines into multiple lines'
+}
+
+# Branching statements that add a path through a function
+_BRANCH_NODES = (ast.If, ast.For, ast.AsyncFor, ast.While)
+
+
+@functools.lru_cache(maxsize=32)
+def _parse_code(code: str) -> ast.Module:
+    """
+    Parse Python source, reporting syntax errors as ValueError
+    
+    Parses are shared between tools working on the same code, so the
+    returned tree must not be modified.
+    """
+    try:
+        return ast.parse(code)
+    except SyntaxError as e:
+        raise ValueError(f"Could not parse code: {e.msg} (line {e.lineno})")
+
+
+class _CodeScan(NamedTuple):
+    """What the analysis tools need from one walk of a module's syntax tree"""
+    functions: Tuple[ast.AST, ...]  # Function definitions, in source order
+    has_bare_except: bool
+    uses_eval: bool
+
+
+@functools.lru_cache(maxsize=32)
+def _scan_code(code: str) -> _CodeScan:
+    """
+    Walk parsed source once for every analysis tool
+    
+    Cached alongside the parse, so the tools working on the same code share
+    a single walk of the tree.
+    """
+    functions = []
+    has_bare_except = False
+    uses_eval = False
+    for node in ast.walk(_parse_code(code)):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            functions.append(node)
+        elif isinstance(node, ast.ExceptHandler) and node.type is None:
+            has_bare_except = True
+        elif (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+                and node.func.id == 'eval'):
+            uses_eval = True
+    functions.sort(key=lambda node: (node.lineno, node.col_offset))
+    return _CodeScan(tuple(functions), has_bare_except, uses_eval)
+
+
+def _source_segment(lines: List[str], node: ast.AST) -> str:
+    """Get the source of a node from the pre-split lines of its module"""
+    # Column offsets count UTF-8 bytes, as in ast.get_source_segment
+    first, last = node.lineno - 1, node.end_lineno - 1
+    if first == last:
+        return lines[first].encode()[node.col_offset:node.end_col_offset].decode()
+    head = lines[first].encode()[node.col_offset:].decode()
+    tail = lines[last].encode()[:node.end_col_offset].decode()
+    return ''.join([head] + lines[first + 1:last] + [tail])
+
+
+def _count_branches(tree: ast.AST) -> int:
+    """Count branching statements and boolean operators in a syntax tree"""
+    count = 0
+    for node in ast.walk(tree):
+        if isinstance(node, _BRANCH_NODES):
+            count += 1  # elif is a nested If
+        elif isinstance(node, ast.BoolOp):
+            count += len(node.values) - 1  # One per 'and'/'or'
+    return count
+
+
 def extract_functions(state: WorkflowState) -> Dict[str, Any]:
     """Extract functions from code"""
     code = state.get("code", "")
     
-    # Simple function extraction (looking for 'def ' keyword)
-    functions = []
-    lines = code.split('\n')
-    current_function = None
-    
-    for i, line in enumerate(lines):
-        if line.strip().startswith('def '):
-            if current_function:
-                functions.append(current_function)
-            
-            # Extract function name
-            func_name = line.strip().split('(')[0].replace('def ', '').strip()
-            current_function = {
-                'name': func_name,
-                'start_line': i + 1,
-                'code': line + '\n'
-            }
-        elif current_function:
-            current_function['code'] += line + '\n'
-    
-    if current_function:
-        functions.append(current_function)
+    # Includes nested functions and methods; decorators are not part of 'code'.
+    # The source is split once and each function sliced out of the lines.
+    nodes = _scan_code(code).functions
+    lines = _SOURCE_LINE_RE.findall(code) if nodes else []
+    functions = [
+        {
+            'name': node.name,
+            'start_line': node.lineno,
+            'code': _source_segment(lines, node)
+        }
+        for node in nodes
+    ]
     
     return {
         'functions': functions,
@@ -72,32 +244,68 @@ def extract_functions(state: WorkflowState) -> Dict[str, Any]:
 def check_complexity(state: WorkflowState) -> Dict[str, Any]:
     """Check code complexity of extracted functions"""
     functions = state.get('functions', [])
+    nodes_by_line = {
+        node.lineno: node for node in _scan_code(state.get('code', '')).functions
+    }
     
-    complexity_scores = []
-    for func in functions:
-        code = func.get('code', '')
+    # One score per function, so the list is sized up front
+    complexity_scores: List[Dict[str, Any]] = [None] * len(functions)
+    total_complexity = 0
+    high_complexity_count = 0
+    for index, func in enumerate(functions):
+        node = nodes_by_line.get(func.get('start_line'))
+        if node is None or node.name != func['name']:
+            # Function did not come from state['code'], parse its own source
+            node = _parse_code(func.get('code', ''))
         
         # Simple complexity metric: count control flow statements
-        complexity = 1  # Base complexity
-        complexity += code.count('if ')
-        complexity += code.count('for ')
-        complexity += code.count('while ')
-        complexity += code.count('elif ')
-        complexity += code.count('and ')
-        complexity += code.count('or ')
+        complexity = 1 + _count_branches(node)  # Base complexity + branches
+        is_complex = complexity > 5
         
-        complexity_scores.append({
+        # Aggregates are kept in the same pass rather than re-scanning the scores
+        total_complexity += complexity
+        high_complexity_count += is_complex
+        
+        complexity_scores[index] = {
             'function': func['name'],
             'complexity': complexity,
-            'is_complex': complexity > 5
-        })
+            'is_complex': is_complex
+        }
     
-    avg_complexity = sum(s['complexity'] for s in complexity_scores) / len(complexity_scores) if complexity_scores else 0
+    avg_complexity = total_complexity / len(complexity_scores) if complexity_scores else 0
     
     return {
         'complexity_scores': complexity_scores,
         'average_complexity': avg_complexity,
-        'high_complexity_count': sum(1 for s in complexity_scores if s['is_complex'])
+        'high_complexity_count': high_complexity_count
+    }
+
+
+def check_complexity_batch(state: WorkflowState) -> Dict[str, Any]:
+    """
+    Check complexity of many code sources at once, one score per source
+    
+    A source that does not parse scores None instead of failing the batch,
+    and is left out of the average.
+    """
+    codes = state.get('codes', [])
+    
+    # Same metric as check_complexity, applied to a whole source
+    scores: List[Optional[int]] = [None] * len(codes)
+    total = 0
+    scored = 0
+    for index, code in enumerate(codes):
+        try:
+            tree = _parse_code(code)
+        except ValueError:
+            continue
+        scores[index] = score = 1 + _count_branches(tree)
+        total += score
+        scored += 1
+    
+    return {
+        'batch_complexity': scores,
+        'batch_average_complexity': total / scored if scored else 0
     }
 
 
@@ -108,15 +316,17 @@ def detect_issues(state: WorkflowState) -> Dict[str, Any]:
     
     issues = []
     
-    # Check for common issues
-    if 'except:' in code:
+    # Check for common issues, found by the walk shared with the other tools
+    scan = _scan_code(code)
+    
+    if scan.has_bare_except:
         issues.append({
             'type': 'bare_except',
             'severity': 'medium',
             'message': 'Bare except clause found - should specify exception type'
         })
     
-    if 'eval(' in code:
+    if scan.uses_eval:
         issues.append({
             'type': 'security',
             'severity': 'high',
@@ -134,7 +344,7 @@ def detect_issues(state: WorkflowState) -> Dict[str, Any]:
             })
     
     # Check line length
-    long_lines = sum(1 for line in code.split('\n') if len(line) > 100)
+    long_lines = sum(1 for _ in _LONG_LINE_RE.finditer(code))
     if long_lines > 0:
         issues.append({
             'type': 'style',
@@ -154,48 +364,44 @@ def suggest_improvements(state: WorkflowState) -> Dict[str, Any]:
     issues = state.get('issues', [])
     complexity_scores = state.get('complexity_scores', [])
     
-    suggestions = []
+    # Keyed by message so duplicates collapse as they are added, in order
+    suggestions: Dict[str, None] = {}
     
     # Suggestions based on issues
+    issue_count = 0
     for issue in issues:
-        if issue['type'] == 'bare_except':
-            suggestions.append('Specify exception types in except clauses')
-        elif issue['type'] == 'security':
-            suggestions.append('Remove eval() and use safer alternatives like ast.literal_eval()')
-        elif issue['type'] == 'naming':
-            suggestions.append('Rename functions to follow PEP 8 naming conventions')
-        elif issue['type'] == 'style':
-            suggestions.append('Break long lines into multiple lines')
+        issue_count += 1
+        suggestion = _SUGGESTION_MAP.get(issue['type'])
+        if suggestion:
+            suggestions[suggestion] = None
     
     # Suggestions based on complexity
+    high_complexity_count = 0
     for score in complexity_scores:
         if score['is_complex']:
-            suggestions.append(f"Refactor function '{score['function']}' to reduce complexity")
+            high_complexity_count += 1
+            suggestions[f"Refactor function '{score['function']}' to reduce complexity"] = None
     
     # Calculate quality score
-    issue_count = state.get('issue_count', 0)
-    high_complexity_count = state.get('high_complexity_count', 0)
     quality_score = max(0, 100 - (issue_count * 10) - (high_complexity_count * 15))
     
     return {
-        'suggestions': list(set(suggestions)),  # Remove duplicates
+        'suggestions': list(suggestions),
         'quality_score': quality_score
     }
 
 
-def increment_iteration(state: WorkflowState) -> Dict[str, Any]:
+def increment_iteration(state: WorkflowState) -> None:
     """Increment iteration counter for loops"""
-    current_iteration = state.get('iteration', 0)
-    return {
-        'iteration': current_iteration + 1
-    }
+    state.increment('iteration')
 
 
 # Register all tools
-tool_registry.register('extract_functions', extract_functions)
-tool_registry.register('check_complexity', check_complexity)
-tool_registry.register('detect_issues', detect_issues)
-tool_registry.register('suggest_improvements', suggest_improvements)
+tool_registry.register('extract_functions', extract_functions, reads=['code'])
+tool_registry.register('check_complexity', check_complexity, reads=['functions', 'code'])
+tool_registry.register('check_complexity_batch', check_complexity_batch, reads=['codes'])
+tool_registry.register('detect_issues', detect_issues, reads=['code', 'functions'])
+tool_registry.register('suggest_improvements', suggest_improvements, reads=['issues', 'complexity_scores'])
 tool_registry.register('increment_iteration', increment_iteration)
 
 
@@ -216,3 +422,9 @@ def log_state(state: WorkflowState) -> Dict[str, Any]:
 
 tool_registry.register('pass_through', pass_through)
 tool_registry.register('log_state', log_state)
+
+# log_state prints, so it is the only tool left out
+tool_registry.register_pure(
+    'extract_functions', 'check_complexity', 'check_complexity_batch', 'detect_issues',
+    'suggest_improvements', 'increment_iteration', 'pass_through'
+)
@@ -1,6 +1,10 @@
 """
 Example workflow definitions for the workflow engine
+
+The workflow definitions are frozen into read-only mappings at import.
 """
+from types import MappingProxyType
+import sys
 
 # Code Review Workflow
 CODE_REVIEW_WORKFLOW = {
@@ -227,3 +231,20 @@ def risky_function(code):
 def VeryLongLineFunctionThatDoesNotFollowPep8NamingConventions(parameter1, parameter2, parameter3):
     return parameter1 + parameter2 + parameter3
 """
+
+
+def _freeze(value):
+    """Make a workflow definition read-only, interning its identifier strings"""
+    if isinstance(value, dict):
+        return MappingProxyType({sys.intern(key): _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, str) and value.isidentifier():
+        return sys.intern(value)  # Node names, types and tool names
+    return value
+
+
+# Shared by every importer, so none of them can modify the others' definitions
+CODE_REVIEW_WORKFLOW = _freeze(CODE_REVIEW_WORKFLOW)
+SIMPLE_WORKFLOW = _freeze(SIMPLE_WORKFLOW)
+BRANCHING_WORKFLOW = _freeze(BRANCHING_WORKFLOW)
@@ -5,6 +5,13 @@ from app.engine import Graph, WorkflowState
 from app.tools import tool_registry
 from app.workflows import SIMPLE_WORKFLOW, SAMPLE_CODE_SIMPLE
 import json
+import sys
+
+
+def print_lines(lines):
+    """Print a block of lines with a single write"""
+    if lines:
+        sys.stdout.write("\n".join(lines) + "\n")
 
 
 def main():
@@ -14,10 +21,10 @@ def main():
     
     # Create a graph
     print("\n1. Creating workflow graph...")
-    graph = Graph.create_from_definition(SIMPLE_WORKFLOW, tool_registry)
+    graph = Graph.from_definition_cached(SIMPLE_WORKFLOW, tool_registry)
     print(f"   Graph created: {graph.name}")
     print(f"   Nodes: {len(graph.engine.nodes)}")
-    print(f"   Edges: {len(graph.engine.edges)}")
+    print(f"   Edges: {graph.edge_count}")
     
     # Prepare initial state
     print("\n2. Preparing initial state...")
@@ -25,8 +32,7 @@ def main():
         "code": SAMPLE_CODE_SIMPLE
     }
     print(f"   Code sample:")
-    for line in SAMPLE_CODE_SIMPLE.strip().split('\n'):
-        print(f"     {line}")
+    print_lines([f"     {line}" for line in SAMPLE_CODE_SIMPLE.strip().splitlines()])
     
     # Run the workflow
     print("\n3. Executing workflow...")
@@ -40,8 +46,7 @@ def main():
         print(f"   ✅ Execution completed successfully")
     
     print(f"\n   Execution steps:")
-    for i, entry in enumerate(execution_log, 1):
-        print(f"     {i}. {entry['node_name']}")
+    print_lines([f"     {i}. {entry['node_name']}" for i, entry in enumerate(execution_log, 1)])
     
     print(f"\n   Final state:")
     print(f"     - Functions found: {final_state.get('function_count', 0)}")
@@ -49,20 +54,26 @@ def main():
     
     if final_state.get('functions'):
         print(f"\n   Extracted functions:")
-        for func in final_state['functions']:
-            print(f"     - {func['name']} (line {func['start_line']})")
+        print_lines([
+            f"     - {func['name']} (line {func['start_line']})"
+            for func in final_state['functions']
+        ])
     
     if final_state.get('complexity_scores'):
         print(f"\n   Complexity scores:")
-        for score in final_state['complexity_scores']:
-            status = "⚠️ Complex" if score['is_complex'] else "✅ Simple"
-            print(f"     - {score['function']}: {score['complexity']} {status}")
+        print_lines([
+            f"     - {score['function']}: {score['complexity']} "
+            + ("⚠️ Complex" if score['is_complex'] else "✅ Simple")
+            for score in final_state['complexity_scores']
+        ])
     
-    print("\n" + "=" * 60)
-    print("Example completed! Now try:")
-    print("  1. Start the API server: uvicorn app.main:app --reload")
-    print("  2. Run tests: python test_workflow.py")
-    print("=" * 60)
+    print_lines([
+        "\n" + "=" * 60,
+        "Example completed! Now try:",
+        "  1. Start the API server: uvicorn app.main:app --reload",
+        "  2. Run tests: python test_workflow.py",
+        "=" * 60
+    ])
 
 
 if __name__ == "__main__":
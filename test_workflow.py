@@ -2,11 +2,14 @@
 Test script to demonstrate the workflow engine
 Run this after starting the FastAPI server
 """
-import requests
-import json
+import asyncio
+import sys
+from datetime import datetime
+import httpx
+import orjson
 from app.workflows import (
-    CODE_REVIEW_WORKFLOW, 
-    SIMPLE_WORKFLOW, 
+    CODE_REVIEW_WORKFLOW,
+    SIMPLE_WORKFLOW,
     BRANCHING_WORKFLOW,
     SAMPLE_CODE_SIMPLE,
     SAMPLE_CODE_COMPLEX,
@@ -14,113 +17,166 @@ from app.workflows import (
 )
 
 BASE_URL = "http://localhost:8000"
+JSON_HEADERS = {"Content-Type": "application/json"}
 
+# Log timestamps arrive as epoch nanoseconds; only format them for a terminal
+FORMAT_TIMESTAMPS = sys.stdout.isatty()
 
-def test_health():
+
+def format_timestamp(timestamp_ns):
+    """Format an epoch-nanosecond timestamp for display"""
+    if FORMAT_TIMESTAMPS:
+        return datetime.fromtimestamp(timestamp_ns / 1e9).isoformat()
+    return str(timestamp_ns)
+
+
+async def test_health(client):
     """Test health endpoint"""
     print("\n=== Testing Health Endpoint ===")
-    response = requests.get(f"{BASE_URL}/health")
+    response = await client.get("/health")
     print(f"Status: {response.status_code}")
-    print(f"Response: {response.json()}")
+    print(f"Response: {orjson.loads(response.content)}")
     return response.status_code == 200
 
 
-def test_list_tools():
+async def test_list_tools(client):
     """Test listing available tools"""
     print("\n=== Listing Available Tools ===")
-    response = requests.get(f"{BASE_URL}/tools")
-    data = response.json()
+    response = await client.get("/tools")
+    data = orjson.loads(response.content)
     print(f"Available tools ({data['count']}):")
     for tool in data['tools']:
         print(f"  - {tool}")
     return response.status_code == 200
 
 
-def test_create_graph(workflow_def):
+async def test_create_graph(client, workflow_def, log=print):
     """Test creating a graph"""
-    print(f"\n=== Creating Graph: {workflow_def['name']} ===")
-    response = requests.post(f"{BASE_URL}/graph/create", json=workflow_def)
+    log(f"\n=== Creating Graph: {workflow_def['name']} ===")
+    # The example workflows are read-only mappings, encoded as dicts
+    response = await client.post(
+        "/graph/create",
+        content=orjson.dumps(workflow_def, default=dict),
+        headers=JSON_HEADERS
+    )
     
     if response.status_code == 200:
-        data = response.json()
-        print(f"Graph created successfully!")
-        print(f"  Graph ID: {data['graph_id']}")
-        print(f"  Nodes: {data['node_count']}")
-        print(f"  Edges: {data['edge_count']}")
+        data = orjson.loads(response.content)
+        log(f"Graph created successfully!")
+        log(f"  Graph ID: {data['graph_id']}")
+        log(f"  Nodes: {data['node_count']}")
+        log(f"  Edges: {data['edge_count']}")
         return data['graph_id']
     else:
-        print(f"Failed to create graph: {response.status_code}")
-        print(f"Error: {response.text}")
+        log(f"Failed to create graph: {response.status_code}")
+        log(f"Error: {response.text}")
         return None
 
 
-def test_run_graph(graph_id, initial_state, description=""):
-    """Test running a graph"""
-    print(f"\n=== Running Graph {description} ===")
-    print(f"Graph ID: {graph_id}")
-    print(f"Initial state keys: {list(initial_state.keys())}")
+async def test_run_graph(client, graph_id, initial_state, description="", log=print, stream=True):
+    """Test running a graph, through the NDJSON stream or the plain endpoint"""
+    log(f"\n=== Running Graph {description} ===")
+    log(f"Graph ID: {graph_id}")
+    log(f"Initial state keys: {list(initial_state.keys())}")
     
     request = {
         "graph_id": graph_id,
         "initial_state": initial_state
     }
     
-    response = requests.post(f"{BASE_URL}/graph/run", json=request)
-    
-    if response.status_code == 200:
-        data = response.json()
-        print(f"\nExecution completed!")
-        print(f"  Run ID: {data['run_id']}")
-        print(f"  Status: {data['status']}")
-        print(f"  Steps executed: {len(data['execution_log'])}")
-        
-        if data.get('error'):
-            print(f"  Error: {data['error']}")
-        
-        print(f"\nFinal State:")
-        for key, value in data['final_state'].items():
-            if isinstance(value, list):
-                print(f"  {key}: [{len(value)} items]")
-            elif isinstance(value, dict):
-                print(f"  {key}: {{{len(value)} keys}}")
-            else:
-                print(f"  {key}: {value}")
+    if not stream:
+        response = await client.post("/graph/run", content=orjson.dumps(request), headers=JSON_HEADERS)
+        if response.status_code != 200:
+            log(f"Failed to run graph: {response.status_code}")
+            log(f"Error: {response.text}")
+            return None
         
-        print(f"\nExecution Log:")
-        for i, entry in enumerate(data['execution_log'], 1):
-            print(f"  {i}. {entry['node_name']} @ {entry['timestamp']}")
-            if entry.get('error'):
-                print(f"     ERROR: {entry['error']}")
-        
-        return data['run_id']
+        data = orjson.loads(response.content)
+        steps = [(entry['node_name'], entry['timestamp'], entry.get('error'))
+                 for entry in data['execution_log']]
     else:
-        print(f"Failed to run graph: {response.status_code}")
-        print(f"Error: {response.text}")
-        return None
+        # The run streams back as NDJSON: one line per log entry, then the outcome
+        async with client.stream(
+            "POST", "/graph/run/stream", content=orjson.dumps(request), headers=JSON_HEADERS
+        ) as response:
+            if response.status_code != 200:
+                await response.aread()
+                log(f"Failed to run graph: {response.status_code}")
+                log(f"Error: {response.text}")
+                return None
+            
+            steps = []
+            data = None
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                record = orjson.loads(line)
+                if record['type'] == 'log':
+                    # Keep only what is printed, not each full state snapshot
+                    entry = record['entry']
+                    steps.append((entry['node_name'], entry['timestamp'], entry['error']))
+                else:
+                    data = record
+        
+        if data is None:
+            log(f"Stream ended before the run's outcome ({len(steps)} steps received)")
+            return None
+    
+    log(f"\nExecution completed!")
+    log(f"  Run ID: {data['run_id']}")
+    log(f"  Status: {data['status']}")
+    log(f"  Steps executed: {len(steps)}")
+    
+    if data.get('error'):
+        log(f"  Error: {data['error']}")
+    
+    log(f"\nFinal State:")
+    for key, value in data['final_state'].items():
+        if isinstance(value, list):
+            log(f"  {key}: [{len(value)} items]")
+        elif isinstance(value, dict):
+            log(f"  {key}: {{{len(value)} keys}}")
+        else:
+            log(f"  {key}: {value}")
+    
+    log(f"\nExecution Log:")
+    for i, (node_name, timestamp, error) in enumerate(steps, 1):
+        log(f"  {i}. {node_name} @ {format_timestamp(timestamp)}")
+        if error:
+            log(f"     ERROR: {error}")
+    
+    return data['run_id']
 
 
-def test_get_state(run_id):
+async def test_get_state(client, run_id, log=print):
     """Test getting run state"""
-    print(f"\n=== Getting State for Run {run_id} ===")
-    response = requests.get(f"{BASE_URL}/graph/state/{run_id}")
+    log(f"\n=== Getting State for Run {run_id} ===")
+    response = await client.get(f"/graph/state/{run_id}")
     
     if response.status_code == 200:
-        data = response.json()
-        print(f"Status: {data['status']}")
-        print(f"State keys: {list(data['current_state'].keys())}")
+        data = orjson.loads(response.content)
+        log(f"Status: {data['status']}")
+        log(f"State keys: {list(data['current_state'].keys())}")
         return True
     else:
-        print(f"Failed to get state: {response.status_code}")
+        log(f"Failed to get state: {response.status_code}")
         return False
 
 
-def test_list_graphs():
+async def test_list_graphs(client):
     """Test listing all graphs"""
     print("\n=== Listing All Graphs ===")
-    response = requests.get(f"{BASE_URL}/graphs")
+    
+    # HEAD returns just the count, so the full list is only fetched when needed
+    response = await client.head("/graphs")
+    if response.status_code == 200 and response.headers.get("X-Graph-Count") == "0":
+        print("Total graphs: 0")
+        return True
+    
+    response = await client.get("/graphs")
     
     if response.status_code == 200:
-        data = response.json()
+        data = orjson.loads(response.content)
         print(f"Total graphs: {data['count']}")
         for graph in data['graphs']:
             print(f"  - {graph['name']} (ID: {graph['graph_id'][:8]}...)")
@@ -131,61 +187,93 @@ def test_list_graphs():
         return False
 
 
-def main():
-    """Run all tests"""
-    print("=" * 60)
-    print("WORKFLOW ENGINE TEST SUITE")
-    print("=" * 60)
-    
-    # Test health
-    if not test_health():
-        print("\nERROR: Server is not running. Start it with:")
-        print("  python -m uvicorn app.main:app --reload")
-        return
-    
-    # Test list tools
-    test_list_tools()
-    
-    # Test 1: Simple Linear Workflow
-    print("\n" + "=" * 60)
-    print("TEST 1: SIMPLE LINEAR WORKFLOW")
-    print("=" * 60)
-    graph_id = test_create_graph(SIMPLE_WORKFLOW)
+# The workflow tests below run concurrently, so each collects its output
+# and returns it to be printed in order once all of them finish.
+
+async def run_simple(client):
+    """Test 1: Simple Linear Workflow"""
+    lines = []
+    log = lines.append
+    log("\n" + "=" * 60)
+    log("TEST 1: SIMPLE LINEAR WORKFLOW")
+    log("=" * 60)
+    graph_id = await test_create_graph(client, SIMPLE_WORKFLOW, log)
     if graph_id:
-        test_run_graph(graph_id, {"code": SAMPLE_CODE_SIMPLE}, "with simple code")
-    
-    # Test 2: Branching Workflow
-    print("\n" + "=" * 60)
-    print("TEST 2: BRANCHING WORKFLOW")
-    print("=" * 60)
-    graph_id = test_create_graph(BRANCHING_WORKFLOW)
+        await test_run_graph(client, graph_id, {"code": SAMPLE_CODE_SIMPLE}, "with simple code", log,
+                             stream=False)
+    return lines
+
+
+async def run_branching(client):
+    """Test 2: Branching Workflow"""
+    lines = []
+    log = lines.append
+    log("\n" + "=" * 60)
+    log("TEST 2: BRANCHING WORKFLOW")
+    log("=" * 60)
+    graph_id = await test_create_graph(client, BRANCHING_WORKFLOW, log)
     if graph_id:
         # Run with simple code (should skip detect issues)
-        run_id = test_run_graph(graph_id, {"code": SAMPLE_CODE_SIMPLE}, "with simple code")
+        run_id = await test_run_graph(client, graph_id, {"code": SAMPLE_CODE_SIMPLE}, "with simple code", log,
+                             stream=False)
         if run_id:
-            test_get_state(run_id)
+            await test_get_state(client, run_id, log)
         
         # Run with complex code (should detect issues)
-        test_run_graph(graph_id, {"code": SAMPLE_CODE_COMPLEX}, "with complex code")
-    
-    # Test 3: Code Review Workflow with Loop
-    print("\n" + "=" * 60)
-    print("TEST 3: CODE REVIEW WORKFLOW (WITH LOOP)")
-    print("=" * 60)
-    graph_id = test_create_graph(CODE_REVIEW_WORKFLOW)
+        await test_run_graph(client, graph_id, {"code": SAMPLE_CODE_COMPLEX}, "with complex code", log)
+    return lines
+
+
+async def run_code_review(client):
+    """Test 3: Code Review Workflow with Loop"""
+    lines = []
+    log = lines.append
+    log("\n" + "=" * 60)
+    log("TEST 3: CODE REVIEW WORKFLOW (WITH LOOP)")
+    log("=" * 60)
+    graph_id = await test_create_graph(client, CODE_REVIEW_WORKFLOW, log)
     if graph_id:
         # Run with code that has issues (will loop)
-        run_id = test_run_graph(
-            graph_id, 
-            {"code": SAMPLE_CODE_WITH_ISSUES, "iteration": 0}, 
-            "with problematic code"
+        run_id = await test_run_graph(
+            client,
+            graph_id,
+            {"code": SAMPLE_CODE_WITH_ISSUES, "iteration": 0},
+            "with problematic code",
+            log
         )
         
         if run_id:
-            test_get_state(run_id)
+            await test_get_state(client, run_id, log)
+    return lines
+
+
+async def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("WORKFLOW ENGINE TEST SUITE")
+    print("=" * 60)
     
-    # List all graphs
-    test_list_graphs()
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=30.0) as client:
+        # Test health
+        if not await test_health(client):
+            print("\nERROR: Server is not running. Start it with:")
+            print("  python -m uvicorn app.main:app --reload")
+            return
+        
+        # Test list tools
+        await test_list_tools(client)
+        
+        # The three workflow tests are independent, so run them concurrently
+        results = await asyncio.gather(
+            run_simple(client),
+            run_branching(client),
+            run_code_review(client)
+        )
+        for lines in results:
+            print("\n".join(lines))
+        
+        # List all graphs
+        await test_list_graphs(client)
     
     print("\n" + "=" * 60)
     print("TESTS COMPLETED")
@@ -194,8 +282,8 @@ def main():
 
 if __name__ == "__main__":
     try:
-        main()
-    except requests.exceptions.ConnectionError:
+        asyncio.run(main())
+    except httpx.ConnectError:
         print("\nERROR: Cannot connect to server at http://localhost:8000")
         print("Please start the server first:")
         print("  python -m uvicorn app.main:app --reload")
@@ -1,165 +1,303 @@
 """
 Simple verification script to test the workflow engine components
 """
-print("=" * 60)
-print("WORKFLOW ENGINE - VERIFICATION TEST")
-print("=" * 60)
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import io
+import sys
+import traceback
 
-# Test 1: Import all modules
-print("\n1. Testing module imports...")
-try:
-    from app.engine import WorkflowEngine, WorkflowState, Node, Edge, Graph
-    from app.models import GraphCreate, GraphRunRequest, GraphRunResponse
-    from app.tools import tool_registry
-    from app.storage import storage
-    from app.workflows import CODE_REVIEW_WORKFLOW, SAMPLE_CODE_SIMPLE
-    print("   ✅ All modules imported successfully")
-except Exception as e:
-    print(f"   ❌ Import failed: {e}")
-    exit(1)
 
-# Test 2: Check tool registry
-print("\n2. Testing tool registry...")
-try:
-    tools = tool_registry.list_tools()
-    print(f"   ✅ {len(tools)} tools registered: {', '.join(tools)}")
-except Exception as e:
-    print(f"   ❌ Tool registry failed: {e}")
-    exit(1)
+# Tests 3-5 share no state, so they run in worker processes. Each returns
+# whether it passed along with its output, which is printed in test order.
 
-# Test 3: Create and run a simple workflow
-print("\n3. Testing workflow execution...")
-try:
-    from app.workflows import SIMPLE_WORKFLOW
+def run_test3():
+    """Test 3: Create and run a simple workflow"""
+    lines = ["\n3. Testing workflow execution..."]
+    try:
+        from app.engine import Graph
+        from app.tools import tool_registry
+        from app.workflows import SIMPLE_WORKFLOW, SAMPLE_CODE_SIMPLE
+        
+        # Create graph
+        graph = Graph.from_definition_cached(SIMPLE_WORKFLOW, tool_registry)
+        lines.append(f"   ✅ Graph created: {graph.name}")
+        
+        # Run workflow
+        initial_state = {"code": SAMPLE_CODE_SIMPLE}
+        final_state, execution_log, error = graph.run(initial_state)
+        
+        if error:
+            lines.append(f"   ❌ Execution error: {error}")
+            return False, lines
+        
+        lines.append(f"   ✅ Workflow executed successfully")
+        lines.append(f"   - Steps: {len(execution_log)}")
+        lines.append(f"   - Functions found: {final_state.get('function_count', 0)}")
+        lines.append(f"   - Average complexity: {final_state.get('average_complexity', 0):.2f}")
     
-    # Create graph
-    graph = Graph.create_from_definition(SIMPLE_WORKFLOW, tool_registry)
-    print(f"   ✅ Graph created: {graph.name}")
-    
-    # Run workflow
-    initial_state = {"code": SAMPLE_CODE_SIMPLE}
-    final_state, execution_log, error = graph.run(initial_state)
-    
-    if error:
-        print(f"   ❌ Execution error: {error}")
-        exit(1)
+    except Exception as e:
+        lines.append(f"   ❌ Workflow execution failed: {e}")
+        lines.append(traceback.format_exc())
+        return False, lines
+    return True, lines
+
+
+def run_test4():
+    """Test 4: Test conditional branching"""
+    lines = ["\n4. Testing conditional branching..."]
+    try:
+        from app.engine import Graph
+        from app.tools import tool_registry
+        from app.workflows import BRANCHING_WORKFLOW, SAMPLE_CODE_COMPLEX
+        
+        graph = Graph.from_definition_cached(BRANCHING_WORKFLOW, tool_registry)
+        initial_state = {"code": SAMPLE_CODE_COMPLEX}
+        final_state, execution_log, error = graph.run(initial_state)
+        
+        if error:
+            lines.append(f"   ❌ Branching failed: {error}")
+            return False, lines
+        
+        # Check if detect_issues node was executed (should be for complex code)
+        node_names = [entry['node_name'] for entry in execution_log]
+        
+        if 'detect' in node_names:
+            lines.append(f"   ✅ Conditional branching works correctly")
+            lines.append(f"   - Branch taken: complexity -> detect -> end")
+        else:
+            lines.append(f"   ⚠️  Unexpected branch taken")
     
-    print(f"   ✅ Workflow executed successfully")
-    print(f"   - Steps: {len(execution_log)}")
-    print(f"   - Functions found: {final_state.get('function_count', 0)}")
-    print(f"   - Average complexity: {final_state.get('average_complexity', 0):.2f}")
+    except Exception as e:
+        lines.append(f"   ❌ Branching test failed: {e}")
+        lines.append(traceback.format_exc())
+        return False, lines
+    return True, lines
+
+
+def run_test5():
+    """Test 5: Test looping workflow"""
+    lines = ["\n5. Testing loop support..."]
+    try:
+        from app.engine import Graph
+        from app.tools import tool_registry
+        from app.workflows import CODE_REVIEW_WORKFLOW, SAMPLE_CODE_WITH_ISSUES
+        
+        graph = Graph.from_definition_cached(CODE_REVIEW_WORKFLOW, tool_registry)
+        initial_state = {"code": SAMPLE_CODE_WITH_ISSUES, "iteration": 0}
+        final_state, execution_log, error = graph.run(initial_state)
+        
+        if error:
+            lines.append(f"   ❌ Loop test failed: {error}")
+            return False, lines
+        
+        iterations = final_state.get('iteration', 0)
+        quality_score = final_state.get('quality_score', 0)
+        
+        lines.append(f"   ✅ Loop executed successfully")
+        lines.append(f"   - Iterations: {iterations}")
+        lines.append(f"   - Quality score: {quality_score}")
+        lines.append(f"   - Total steps: {len(execution_log)}")
+        
+        # Verify loop happened
+        if iterations > 0:
+            lines.append(f"   ✅ Loop functionality verified")
     
-except Exception as e:
-    print(f"   ❌ Workflow execution failed: {e}")
-    import traceback
-    traceback.print_exc()
-    exit(1)
+    except Exception as e:
+        lines.append(f"   ❌ Loop test failed: {e}")
+        lines.append(traceback.format_exc())
+        return False, lines
+    return True, lines
 
-# Test 4: Test conditional branching
-print("\n4. Testing conditional branching...")
-try:
-    from app.workflows import BRANCHING_WORKFLOW, SAMPLE_CODE_COMPLEX
+
+def main():
+    """Run all verification tests"""
+    print("=" * 60)
+    print("WORKFLOW ENGINE - VERIFICATION TEST")
+    print("=" * 60)
     
-    graph = Graph.create_from_definition(BRANCHING_WORKFLOW, tool_registry)
-    initial_state = {"code": SAMPLE_CODE_COMPLEX}
-    final_state, execution_log, error = graph.run(initial_state)
+    # Test 1: Import all modules
+    print("\n1. Testing module imports...")
+    try:
+        from app.engine import WorkflowEngine, WorkflowState, Node, Edge, Graph
+        from app.models import GraphCreate, GraphRunRequest, GraphRunResponse
+        from app.tools import tool_registry
+        from app.storage import storage
+        from app.workflows import CODE_REVIEW_WORKFLOW, SIMPLE_WORKFLOW, SAMPLE_CODE_SIMPLE
+        print("   ✅ All modules imported successfully")
+    except Exception as e:
+        print(f"   ❌ Import failed: {e}")
+        exit(1)
     
-    if error:
-        print(f"   ❌ Branching failed: {error}")
+    # Test 2: Check tool registry
+    print("\n2. Testing tool registry...")
+    try:
+        tools = tool_registry.list_tools()
+        print(f"   ✅ {len(tools)} tools registered: {', '.join(tools)}")
+    except Exception as e:
+        print(f"   ❌ Tool registry failed: {e}")
         exit(1)
     
-    # Check if detect_issues node was executed (should be for complex code)
-    node_names = [entry['node_name'] for entry in execution_log]
+    # Warm up imports, caches and the interpreter with one silent run, using
+    # the same constructor as the tests. Only forked workers (the Linux
+    # default) inherit the warm state; under spawn (macOS, Windows) they start
+    # cold and just the tests run in this process benefit. Any failure is
+    # left for the tests below to report.
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            Graph.from_definition_cached(SIMPLE_WORKFLOW, tool_registry).run({"code": SAMPLE_CODE_SIMPLE})
+    except Exception:
+        pass
     
-    if 'detect' in node_names:
-        print(f"   ✅ Conditional branching works correctly")
-        print(f"   - Branch taken: complexity -> detect -> end")
-    else:
-        print(f"   ⚠️  Unexpected branch taken")
+    # Tests 3-5: Workflow execution, branching and loops, run in parallel
+    with ProcessPoolExecutor(max_workers=3) as executor:
+        futures = [executor.submit(test) for test in (run_test3, run_test4, run_test5)]
+        for future in futures:
+            passed, lines = future.result()
+            sys.stdout.write("\n".join(lines) + "\n")  # One write per test
+            if not passed:
+                exit(1)
     
-except Exception as e:
-    print(f"   ❌ Branching test failed: {e}")
-    import traceback
-    traceback.print_exc()
-    exit(1)
-
-# Test 5: Test looping workflow
-print("\n5. Testing loop support...")
-try:
-    from app.workflows import CODE_REVIEW_WORKFLOW, SAMPLE_CODE_WITH_ISSUES
+    # Test 6: Test storage
+    print("\n6. Testing storage layer...")
+    try:
+        from app.storage import Storage
+        
+        test_storage = Storage()
+        
+        # Create and save a graph
+        test_graph = Graph.from_definition_cached(SIMPLE_WORKFLOW, tool_registry)
+        graph_id = test_storage.save_graph(test_graph)
+        
+        # Retrieve graph
+        retrieved = test_storage.get_graph(graph_id)
+        
+        if retrieved and retrieved.graph_id == graph_id:
+            print(f"   ✅ Storage works correctly")
+            print(f"   - Saved graph: {graph_id[:8]}...")
+            print(f"   - Retrieved successfully")
+        else:
+            print(f"   ❌ Storage retrieval failed")
+            exit(1)
     
-    graph = Graph.create_from_definition(CODE_REVIEW_WORKFLOW, tool_registry)
-    initial_state = {"code": SAMPLE_CODE_WITH_ISSUES, "iteration": 0}
-    final_state, execution_log, error = graph.run(initial_state)
+    except Exception as e:
+        print(f"   ❌ Storage test failed: {e}")
+        exit(1)
     
-    if error:
-        print(f"   ❌ Loop test failed: {error}")
+    # Test 7: FastAPI app structure
+    print("\n7. Testing FastAPI app...")
+    try:
+        from app.main import app
+        
+        routes = [route.path for route in app.routes if hasattr(route, 'path')]
+        print(f"   ✅ FastAPI app loaded successfully")
+        print(f"   - Available endpoints: {len(routes)}")
+        print(f"   - Key routes: /graph/create, /graph/run, /graph/state/{{run_id}}")
+    
+    except Exception as e:
+        print(f"   ❌ FastAPI app test failed: {e}")
         exit(1)
     
-    iterations = final_state.get('iteration', 0)
-    quality_score = final_state.get('quality_score', 0)
+    # Test 8: Concurrent execution
+    print("\n8. Testing concurrent execution...")
+    try:
+        from app.workflows import SAMPLE_CODE_WITH_ISSUES
+        
+        # Diamond: extract fans out to three branches that join at suggest
+        diamond = {
+            "name": "Concurrent Diamond",
+            "nodes": [
+                {"name": "extract", "function_name": "extract_functions"},
+                {"name": "complexity", "function_name": "check_complexity"},
+                {"name": "detect", "function_name": "detect_issues"},
+                {"name": "count", "function_name": "increment_iteration"},
+                {"name": "suggest", "function_name": "suggest_improvements"}
+            ],
+            "edges": [
+                {"from_node": "extract", "to_node": "complexity"},
+                {"from_node": "extract", "to_node": "detect"},
+                {"from_node": "extract", "to_node": "count"},
+                {"from_node": "complexity", "to_node": "suggest"},
+                {"from_node": "detect", "to_node": "suggest"},
+                {"from_node": "count", "to_node": "suggest"}
+            ],
+            "start_node": "extract"
+        }
+        initial_state = {"code": SAMPLE_CODE_WITH_ISSUES, "iteration": 0}
+        
+        graph = Graph.create_from_definition(diamond, tool_registry)
+        final_state, execution_log, error = graph.run_concurrent(initial_state)
+        node_names = [entry['node_name'] for entry in execution_log]
+        deltas = {entry['node_name']: entry['delta'] for entry in execution_log}
+        
+        if error or sorted(node_names) != sorted(["extract", "complexity", "detect", "count", "suggest"]):
+            print(f"   ❌ Diamond run failed: {error or node_names}")
+            exit(1)
+        if node_names[-1] != "suggest" or 'quality_score' not in final_state:
+            print(f"   ❌ Join ran before its branches: {node_names}")
+            exit(1)
+        # Each branch's writes must be logged against that branch only
+        if (deltas['count'] != {"iteration": 1} or 'iteration' in deltas['complexity']
+                or 'issues' not in deltas['detect'] or 'complexity_scores' in deltas['detect']):
+            print(f"   ❌ Branch writes logged against the wrong node: {deltas}")
+            exit(1)
+        print(f"   ✅ Diamond ran each node once and joined after all branches")
+        
+        # Skipped branch: complexity's only incoming edge is never taken
+        skipped = dict(diamond, edges=[
+            {"from_node": "extract", "to_node": "complexity", "condition": "function_count > 100"}
+        ] + diamond["edges"][1:])
+        graph = Graph.create_from_definition(skipped, tool_registry)
+        final_state, execution_log, error = graph.run_concurrent(initial_state)
+        node_names = [entry['node_name'] for entry in execution_log]
+        
+        if error or 'complexity' in node_names or node_names.count("suggest") != 1:
+            print(f"   ❌ Skipped-branch join failed: {error or node_names}")
+            exit(1)
+        print(f"   ✅ Join still ran once with a skipped branch")
     
-    print(f"   ✅ Loop executed successfully")
-    print(f"   - Iterations: {iterations}")
-    print(f"   - Quality score: {quality_score}")
-    print(f"   - Total steps: {len(execution_log)}")
+    except Exception as e:
+        print(f"   ❌ Concurrent execution test failed: {e}")
+        traceback.print_exc()
+        exit(1)
     
-    # Verify loop happened
-    if iterations > 0:
-        print(f"   ✅ Loop functionality verified")
+    # Test 9: Batch complexity
+    print("\n9. Testing batch complexity...")
+    try:
+        from app.workflows import SAMPLE_CODE_COMPLEX
+        
+        check_complexity_batch = tool_registry.get_tool('check_complexity_batch')
+        codes = [SAMPLE_CODE_SIMPLE, SAMPLE_CODE_COMPLEX, "def broken(:\n    pass\n"]
+        result = check_complexity_batch(WorkflowState({"codes": codes}))
+        scores = result['batch_complexity']
+        
+        # The branching sample scores higher; the broken source scores None
+        if len(scores) != 3 or None in scores[:2] or scores[0] >= scores[1] or scores[2] is not None:
+            print(f"   ❌ Unexpected batch scores: {scores}")
+            exit(1)
+        if result['batch_average_complexity'] != (scores[0] + scores[1]) / 2:
+            print(f"   ❌ Average should skip unparseable sources: {result['batch_average_complexity']}")
+            exit(1)
+        print(f"   ✅ Batch scored {len(codes)} sources: {scores}")
+        print(f"   - Average complexity: {result['batch_average_complexity']:.2f}")
     
-except Exception as e:
-    print(f"   ❌ Loop test failed: {e}")
-    import traceback
-    traceback.print_exc()
-    exit(1)
-
-# Test 6: Test storage
-print("\n6. Testing storage layer...")
-try:
-    from app.storage import Storage
-    
-    test_storage = Storage()
-    
-    # Create and save a graph
-    test_graph = Graph.create_from_definition(SIMPLE_WORKFLOW, tool_registry)
-    graph_id = test_storage.save_graph(test_graph)
-    
-    # Retrieve graph
-    retrieved = test_storage.get_graph(graph_id)
-    
-    if retrieved and retrieved.graph_id == graph_id:
-        print(f"   ✅ Storage works correctly")
-        print(f"   - Saved graph: {graph_id[:8]}...")
-        print(f"   - Retrieved successfully")
-    else:
-        print(f"   ❌ Storage retrieval failed")
+    except Exception as e:
+        print(f"   ❌ Batch complexity test failed: {e}")
+        traceback.print_exc()
         exit(1)
     
-except Exception as e:
-    print(f"   ❌ Storage test failed: {e}")
-    exit(1)
+    sys.stdout.write("\n".join([
+        "\n" + "=" * 60,
+        "ALL TESTS PASSED ✅",
+        "=" * 60,
+        "\nThe workflow engine is working correctly!",
+        "\nNext steps:",
+        "  1. Start server: python -m uvicorn app.main:app --reload",
+        "  2. Visit: http://localhost:8000/docs",
+        "  3. Run API tests: python test_workflow.py",
+        "=" * 60
+    ]) + "\n")
 
-# Test 7: FastAPI app structure
-print("\n7. Testing FastAPI app...")
-try:
-    from app.main import app
-    
-    routes = [route.path for route in app.routes if hasattr(route, 'path')]
-    print(f"   ✅ FastAPI app loaded successfully")
-    print(f"   - Available endpoints: {len(routes)}")
-    print(f"   - Key routes: /graph/create, /graph/run, /graph/state/{{run_id}}")
-    
-except Exception as e:
-    print(f"   ❌ FastAPI app test failed: {e}")
-    exit(1)
 
-print("\n" + "=" * 60)
-print("ALL TESTS PASSED ✅")
-print("=" * 60)
-print("\nThe workflow engine is working correctly!")
-print("\nNext steps:")
-print("  1. Start server: python -m uvicorn app.main:app --reload")
-print("  2. Visit: http://localhost:8000/docs")
-print("  3. Run API tests: python test_workflow.py")
-print("=" * 60)
+if __name__ == "__main__":
+    main()